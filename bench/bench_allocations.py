@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Counts the cffi objects SSLSessionContext creates per call in steady state.
+
+This wraps the ``ffi`` object that ``securetransport.low_level`` uses so
+that every ``ffi.new`` (a fresh C allocation) and ``ffi.from_buffer`` (a
+cdata wrapper around a Python buffer) is counted, then makes repeated calls
+on a handshaken context and reports the average number of each per call,
+along with the calls per second. The context's ciphertext loops back to
+itself in memory, so reads decrypt what the writes produced.
+"""
+import collections
+import time
+
+import common
+
+
+CALLS = 20000
+
+
+class CountingFFI:
+    """
+    Passes everything through to the real ffi object, counting calls to
+    the methods that create cdata objects.
+    """
+    counted = ('new', 'from_buffer')
+
+    def __init__(self, ffi):
+        self._ffi = ffi
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._ffi, name)
+        if name not in self.counted:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+def looped_session_context():
+    """
+    A handshaken SSLSessionContext whose ciphertext comes back to it as
+    input.
+    """
+    from securetransport.low_level import (
+        SSLSessionContext, SSLProtocolSide, SSLConnectionType, SSLErrors
+    )
+
+    would_block = int(SSLErrors.errSSLWouldBlock)
+    loop = bytearray(common.SERVER_HELLO)
+    handshaking = [True]
+
+    def read_func(_, size):
+        data = bytes(loop[:size])
+        del loop[:size]
+        return (0 if len(data) == size else would_block), data
+
+    def write_func(_, data):
+        # Throw away the client hello, but keep everything after it.
+        if not handshaking[0]:
+            loop.extend(data)
+        return 0, len(data)
+
+    context = SSLSessionContext(
+        SSLProtocolSide.Client, SSLConnectionType.StreamType
+    )
+    context.set_io_funcs(read_func, write_func)
+    context.handshake()
+    handshaking[0] = False
+    return context
+
+
+def main():
+    common.parse_args(__doc__.strip().splitlines()[0])
+    from securetransport import low_level
+
+    context = looped_session_context()
+    payload = b'x' * 1024
+
+    def write_then_read():
+        context.write(payload)
+        context.read(len(payload))
+
+    operations = [
+        ('write + read 1 KiB', write_then_read),
+        ('get_session_state', context.get_session_state),
+        ('get_buffered_read_size', context.get_buffered_read_size),
+        ('get_negotiated_cipher', context.get_negotiated_cipher),
+        ('get_negotiated_protocol_version',
+         context.get_negotiated_protocol_version),
+    ]
+
+    counting = CountingFFI(low_level.ffi)
+    rows = []
+    for name, operation in operations:
+        # Warm up, so that one-off allocations aren't counted.
+        operation()
+
+        low_level.ffi = counting
+        counting.calls.clear()
+        start = time.perf_counter()
+        try:
+            for _ in range(CALLS):
+                operation()
+        finally:
+            elapsed = time.perf_counter() - start
+            low_level.ffi = counting._ffi
+
+        rows.append([
+            name,
+            '%.2f' % (counting.calls['new'] / CALLS),
+            '%.2f' % (counting.calls['from_buffer'] / CALLS),
+            '%.0f' % (CALLS / elapsed),
+        ])
+
+    common.report(
+        rows, ['operation', 'ffi.new/call', 'from_buffer/call', 'calls/s']
+    )
+
+
+if __name__ == '__main__':
+    main()
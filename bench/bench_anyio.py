@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Compares SecureTransportStream with WrappedSocket run in worker threads.
+
+Both clients talk to loopback stand-in servers, from anyio's asyncio
+backend:
+
+- ``stream``: ``securetransport.anyio_stream.connect_tls``, which drives
+  the sans-I/O buffer API on the event loop;
+- ``threads``: blocking ``WrappedSocket`` calls handed to
+  ``anyio.to_thread.run_sync``, which is how TLS over SecureTransport had
+  to be done from async code before.
+
+The workloads are: opening many concurrent connections, each doing a
+handshake and closing, reported as handshakes per second; and sending a
+bulk transfer over one connection to a server that discards it, reported in
+MiB/s. (A WrappedSocket can't be used from two threads at once, so the
+threaded client can't send and receive at the same time.)
+"""
+import socket
+import time
+
+import common
+
+
+CHUNK = 64 * 1024
+
+
+async def stream_handshakes(address, context, count):
+    import anyio
+    from securetransport.anyio_stream import connect_tls
+
+    async def one():
+        stream = await connect_tls(
+            *address, context=context, server_hostname='bench'
+        )
+        await stream.aclose()
+
+    start = time.perf_counter()
+    async with anyio.create_task_group() as group:
+        for _ in range(count):
+            group.start_soon(one)
+    return count / (time.perf_counter() - start)
+
+
+async def thread_handshakes(address, context, count):
+    import anyio
+
+    def one():
+        sock = context.wrap_socket(
+            socket.create_connection(address), server_hostname=b'bench'
+        )
+        sock.do_handshake()
+        sock.close()
+
+    start = time.perf_counter()
+    async with anyio.create_task_group() as group:
+        for _ in range(count):
+            group.start_soon(anyio.to_thread.run_sync, one)
+    return count / (time.perf_counter() - start)
+
+
+async def stream_bulk(address, context, total):
+    from securetransport.anyio_stream import connect_tls
+
+    stream = await connect_tls(
+        *address, context=context, server_hostname='bench'
+    )
+    chunk = b'x' * CHUNK
+
+    start = time.perf_counter()
+    for _ in range(total // CHUNK):
+        await stream.send(chunk)
+    elapsed = time.perf_counter() - start
+
+    await stream.aclose()
+    return total / common.MB / elapsed
+
+
+async def thread_bulk(address, context, total):
+    import anyio
+
+    sock = context.wrap_socket(
+        socket.create_connection(address), server_hostname=b'bench'
+    )
+    await anyio.to_thread.run_sync(sock.do_handshake)
+    chunk = b'x' * CHUNK
+
+    start = time.perf_counter()
+    for _ in range(total // CHUNK):
+        await anyio.to_thread.run_sync(sock.sendall, chunk)
+    elapsed = time.perf_counter() - start
+
+    sock.close()
+    return total / common.MB / elapsed
+
+
+async def run(args):
+    from securetransport.tlsapi import SecureTransportClientContext
+
+    echo_address = common.listener(echo=True)
+    discard_address = common.listener(echo=False)
+    context = SecureTransportClientContext(common.configuration())
+
+    rows = []
+    clients = (
+        ('stream', stream_handshakes, stream_bulk),
+        ('threads', thread_handshakes, thread_bulk),
+    )
+    for name, handshakes, bulk in clients:
+        rate = await handshakes(echo_address, context, args.connections)
+        throughput = await bulk(discard_address, context, args.total)
+        rows.append([name, '%.0f' % rate, '%.0f' % throughput])
+    return rows
+
+
+def main():
+    def add_arguments(parser):
+        parser.add_argument(
+            '--connections', type=int, default=500,
+            help="the number of concurrent connections to open"
+        )
+        parser.add_argument(
+            '--total', type=int, default=256 * common.MB,
+            help="the number of bytes to send in the bulk transfer"
+        )
+
+    args = common.parse_args(
+        __doc__.strip().splitlines()[0], add_arguments
+    )
+    import anyio
+
+    rows = anyio.run(run, args, backend='asyncio')
+    common.report(rows, ['client', 'handshakes/s', 'bulk MiB/s'])
+
+
+if __name__ == '__main__':
+    main()
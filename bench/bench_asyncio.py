@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the asyncio transport with the standard library's ssl transport.
+
+Three clients run the same workloads against loopback echo servers:
+
+- ``securetransport``: ``securetransport.aio`` against a server speaking the
+  stand-in protocol;
+- ``ssl``: asyncio's own TLS support, against an ssl server with a
+  throwaway self-signed certificate (made with the ``openssl`` command);
+- ``tcp``: plain asyncio TCP, as a floor.
+
+The workloads are: opening many concurrent connections, each doing one
+small round trip, reported as connections per second; and echoing a bulk
+transfer over one connection, reported in MiB/s.
+
+The stand-in does no cryptography, while ssl does real TLS 1.3, so the
+ssl numbers include costs the stand-in doesn't have. What the comparison
+shows is the overhead of the transport layer itself, and whether one event
+loop can keep many connections going.
+"""
+import asyncio
+import os
+import resource
+import ssl
+import struct
+import subprocess
+import tempfile
+import time
+
+import common
+
+
+class EchoProtocol(asyncio.Protocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+
+class StandinEchoProtocol(asyncio.Protocol):
+    """
+    The server side of the stand-in protocol, echoing application data.
+    """
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+
+    def data_received(self, data):
+        self.buffer += data
+        while len(self.buffer) >= 5:
+            record_type, _, length = struct.unpack_from('>BHH', self.buffer)
+            if len(self.buffer) < 5 + length:
+                return
+
+            record = bytes(self.buffer[:5 + length])
+            del self.buffer[:5 + length]
+            if record_type == common.HANDSHAKE:
+                self.transport.write(common.SERVER_HELLO)
+            elif record_type == common.APPLICATION_DATA:
+                self.transport.write(record)
+            elif record_type == common.ALERT:
+                self.transport.write(common.record(common.ALERT, b'\x01\x00'))
+                self.transport.close()
+                return
+
+
+def make_certificate(directory):
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'ec',
+            '-pkeyopt', 'ec_paramgen_curve:P-256', '-nodes', '-days', '1',
+            '-subj', '/CN=localhost', '-addext',
+            'subjectAltName=DNS:localhost',
+            '-keyout', keyfile, '-out', certfile,
+        ],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+async def start_servers(certfile, keyfile):
+    loop = asyncio.get_running_loop()
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(certfile, keyfile)
+
+    servers = {
+        'securetransport': await loop.create_server(
+            StandinEchoProtocol, '127.0.0.1', 0, backlog=4096
+        ),
+        'ssl': await loop.create_server(
+            EchoProtocol, '127.0.0.1', 0, ssl=server_context, backlog=4096
+        ),
+        'tcp': await loop.create_server(
+            EchoProtocol, '127.0.0.1', 0, backlog=4096
+        ),
+    }
+    return servers
+
+
+def connectors(servers, certfile):
+    from securetransport import aio
+    from securetransport.tlsapi import SecureTransportClientContext
+
+    st_context = SecureTransportClientContext(common.configuration())
+    ssl_context = ssl.create_default_context(cafile=certfile)
+
+    def port(name):
+        return servers[name].sockets[0].getsockname()[1]
+
+    def securetransport():
+        return aio.open_connection(
+            '127.0.0.1', port('securetransport'), context=st_context,
+            server_hostname='bench'
+        )
+
+    def stdlib_ssl():
+        return asyncio.open_connection(
+            '127.0.0.1', port('ssl'), ssl=ssl_context,
+            server_hostname='localhost'
+        )
+
+    def tcp():
+        return asyncio.open_connection('127.0.0.1', port('tcp'))
+
+    return [
+        ('securetransport', securetransport),
+        ('ssl', stdlib_ssl),
+        ('tcp', tcp),
+    ]
+
+
+async def connections_per_second(connect, count):
+    async def one(i):
+        reader, writer = await connect()
+        message = b'%d\n' % i
+        writer.write(message)
+        assert await reader.readexactly(len(message)) == message
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return count / (time.perf_counter() - start)
+
+
+async def bulk_mib_per_second(connect, total):
+    reader, writer = await connect()
+    chunk = b'x' * (64 * 1024)
+
+    async def send():
+        for _ in range(total // len(chunk)):
+            writer.write(chunk)
+            await writer.drain()
+
+    start = time.perf_counter()
+    sender = asyncio.ensure_future(send())
+    await reader.readexactly(total // len(chunk) * len(chunk))
+    await sender
+    elapsed = time.perf_counter() - start
+
+    writer.close()
+    await writer.wait_closed()
+    return total / common.MB / elapsed
+
+
+async def run(args, certfile, keyfile):
+    servers = await start_servers(certfile, keyfile)
+    rows = []
+    for name, connect in connectors(servers, certfile):
+        rate = await connections_per_second(connect, args.connections)
+        throughput = await bulk_mib_per_second(connect, args.total)
+        rows.append([name, '%.0f' % rate, '%.0f' % throughput])
+
+    for server in servers.values():
+        server.close()
+    return rows
+
+
+def main():
+    def add_arguments(parser):
+        parser.add_argument(
+            '--connections', type=int, default=2000,
+            help="the number of concurrent connections to open"
+        )
+        parser.add_argument(
+            '--total', type=int, default=128 * common.MB,
+            help="the number of bytes to echo in the bulk transfer"
+        )
+
+    args = common.parse_args(
+        __doc__.strip().splitlines()[0], add_arguments
+    )
+
+    # Each connection needs a file descriptor at both ends.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.connections * 2 + 100
+    if soft < wanted:
+        resource.setrlimit(
+            resource.RLIMIT_NOFILE, (min(wanted, hard), hard)
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = make_certificate(directory)
+        rows = asyncio.run(run(args, certfile, keyfile))
+
+    common.report(rows, ['client', 'connections/s', 'bulk MiB/s'])
+
+
+if __name__ == '__main__':
+    main()
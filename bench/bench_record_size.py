@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Compares time to first byte and throughput with and without a
+RecordSizePolicy.
+
+Each run sends a response through WrappedSocket to a stand-in server over a
+loopback socket pair. Time to first byte is measured from the start of
+``sendall`` to the server receiving the first whole application data
+record, which is the first point at which a real peer could decrypt
+anything. Throughput is measured over a bulk transfer on one connection.
+"""
+import statistics
+import threading
+import time
+
+import common
+
+
+def connection(policy, on_record=None):
+    from securetransport.tlsapi import SecureTransportClientContext
+
+    context = SecureTransportClientContext(
+        common.configuration(), record_size_policy=policy
+    )
+    sock = context.wrap_socket(
+        common.peer_socket(echo=False, on_record=on_record),
+        server_hostname=b'bench'
+    )
+    sock.do_handshake()
+    return sock
+
+
+def first_byte(policy, payload):
+    """
+    Sends ``payload`` on a new connection, and returns the time taken for
+    its first record to arrive.
+    """
+    first_record = threading.Event()
+    arrived = []
+
+    def on_record(record_type, length):
+        if record_type == common.APPLICATION_DATA and not arrived:
+            arrived.append(time.perf_counter())
+            first_record.set()
+
+    sock = connection(policy, on_record)
+    start = time.perf_counter()
+    sock.sendall(payload)
+    first_record.wait()
+    sock.close()
+    return arrived[0] - start
+
+
+def time_to_first_byte(policy, response_size, repeats):
+    payload = b'x' * response_size
+    return statistics.median(
+        first_byte(policy, payload) for _ in range(repeats)
+    )
+
+
+def throughput(policy, total):
+    records = []
+
+    def on_record(record_type, length):
+        if record_type == common.APPLICATION_DATA:
+            records.append(length)
+
+    sock = connection(policy, on_record)
+    chunk = memoryview(b'x' * common.MB)
+    start = time.perf_counter()
+    for _ in range(total // common.MB):
+        sock.sendall(chunk)
+    elapsed = time.perf_counter() - start
+    sock.close()
+
+    return total / common.MB / elapsed, statistics.mean(records)
+
+
+def main():
+    def add_arguments(parser):
+        parser.add_argument(
+            '--response-size', type=int, default=256 * 1024,
+            help="the size of each response for time to first byte"
+        )
+        parser.add_argument(
+            '--repeats', type=int, default=50,
+            help="the number of connections to time the first byte on"
+        )
+        parser.add_argument(
+            '--total', type=int, default=256 * common.MB,
+            help="the number of bytes to send when measuring throughput"
+        )
+
+    args = common.parse_args(
+        __doc__.strip().splitlines()[0], add_arguments
+    )
+    from securetransport.tlsapi import RecordSizePolicy
+
+    rows = []
+    for name, policy in (('none', None), ('default', RecordSizePolicy())):
+        ttfb = time_to_first_byte(policy, args.response_size, args.repeats)
+        mb_per_second, mean_record = throughput(policy, args.total)
+        rows.append([
+            name,
+            '%.1f' % (ttfb * 1e6),
+            '%.0f' % mb_per_second,
+            '%.0f' % mean_record,
+        ])
+
+    common.report(
+        rows, ['policy', 'TTFB (us)', 'MiB/s', 'mean record (B)']
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Counts the syscalls and copies WrappedSocket makes to send ciphertext.
+
+This sends data over a loopback socket pair to a stand-in server that
+discards it, through a socket subclass that counts the send calls the
+wrapper makes. It reports send syscalls per MiB of plaintext, and the bytes
+of ciphertext copied in user space on the way out, per MiB: those are the
+copies ``peek_bytes`` makes, plus any the socket's ``io_stats`` records
+where the checkout has them.
+"""
+import socket
+import time
+
+import common
+
+
+class CountingSocket(socket.socket):
+    """
+    A socket that counts the calls made to send data.
+    """
+    send_calls = 0
+
+    def send(self, *args, **kwargs):
+        self.send_calls += 1
+        return super().send(*args, **kwargs)
+
+    def sendmsg(self, *args, **kwargs):
+        self.send_calls += 1
+        return super().sendmsg(*args, **kwargs)
+
+
+def run(sends, size):
+    from securetransport.tlsapi import (
+        SecureTransportClientContext, _SecureTransportBuffer
+    )
+
+    copied = [0]
+    peek_bytes = _SecureTransportBuffer.peek_bytes
+
+    def counting_peek_bytes(self, amt):
+        data = peek_bytes(self, amt)
+        copied[0] += len(data)
+        return data
+
+    raw = common.peer_socket(echo=False)
+    counting = CountingSocket(fileno=raw.detach())
+
+    context = SecureTransportClientContext(common.configuration())
+    sock = context.wrap_socket(counting, server_hostname=b'bench')
+    sock.do_handshake()
+
+    io_stats = getattr(sock, 'io_stats', None)
+    copied_before = io_stats.bytes_copied if io_stats is not None else 0
+    counting.send_calls = 0
+
+    payload = b'x' * size
+    _SecureTransportBuffer.peek_bytes = counting_peek_bytes
+    start = time.perf_counter()
+    try:
+        for _ in range(sends):
+            sock.sendall(payload)
+    finally:
+        elapsed = time.perf_counter() - start
+        _SecureTransportBuffer.peek_bytes = peek_bytes
+
+    if io_stats is not None:
+        copied[0] += io_stats.bytes_copied - copied_before
+
+    mib = sends * size / common.MB
+    sock.close()
+    return [
+        '%d x %d B' % (sends, size),
+        '%.1f' % (counting.send_calls / mib),
+        '%.0f' % (copied[0] / 1024 / mib),
+        '%.1f' % (mib / elapsed),
+    ]
+
+
+def main():
+    common.parse_args(__doc__.strip().splitlines()[0])
+
+    rows = [
+        run(sends=8, size=common.MB),
+        run(sends=8192, size=1024),
+        run(sends=32768, size=256),
+    ]
+    common.report(
+        rows, ['sends', 'syscalls/MiB', 'KiB copied/MiB', 'MiB/s']
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Measures how much plaintext is copied on its way to SSLWrite.
+
+For each kind of buffer, this writes 1 MiB through
+``SSLSessionContext.write``, and through ``WrappedSocket.sendall`` to a
+stand-in server, and reports the peak memory Python allocated during the
+write, in KiB per MiB written. A copy of the payload shows up as about 1024
+KiB. Ciphertext records are copied as they pass through the Python I/O
+callbacks, so one record's worth (about 16 KiB) is the floor.
+
+Writes that raise are reported as errors: before buffer-protocol objects
+were passed through, some kinds of buffer weren't accepted at all.
+"""
+import array
+import mmap
+import statistics
+import tracemalloc
+
+import common
+
+
+REPEATS = 10
+
+
+def payloads():
+    data = b'x' * common.MB
+
+    mapped = mmap.mmap(-1, common.MB)
+    mapped.write(data)
+
+    return [
+        ('bytes', data),
+        ('bytearray', bytearray(data)),
+        ('memoryview', memoryview(data)),
+        ('array.array', array.array('I', data)),
+        ('mmap', mapped),
+    ]
+
+
+def session_context():
+    """
+    A handshaken SSLSessionContext whose ciphertext goes nowhere.
+    """
+    from securetransport.low_level import (
+        SSLSessionContext, SSLProtocolSide, SSLConnectionType, SSLErrors
+    )
+
+    would_block = int(SSLErrors.errSSLWouldBlock)
+    incoming = bytearray(common.SERVER_HELLO)
+
+    def read_func(_, size):
+        data = bytes(incoming[:size])
+        del incoming[:size]
+        return (0 if len(data) == size else would_block), data
+
+    def write_func(_, data):
+        return 0, len(data)
+
+    context = SSLSessionContext(
+        SSLProtocolSide.Client, SSLConnectionType.StreamType
+    )
+    context.set_io_funcs(read_func, write_func)
+    context.handshake()
+    return context
+
+
+def wrapped_socket():
+    from securetransport.tlsapi import SecureTransportClientContext
+
+    context = SecureTransportClientContext(common.configuration())
+    sock = context.wrap_socket(
+        common.peer_socket(echo=False), server_hostname=b'bench'
+    )
+    sock.do_handshake()
+    return sock
+
+
+def peak_kib(write, payload):
+    """
+    The median peak of memory allocated by ``write(payload)``, in KiB.
+    """
+    peaks = []
+    for _ in range(REPEATS):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        write(payload)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    return '%.1f' % (statistics.median(peaks) / 1024)
+
+
+def main():
+    common.parse_args(__doc__.strip().splitlines()[0])
+
+    context = session_context()
+    sock = wrapped_socket()
+    tracemalloc.start()
+
+    rows = []
+    for name, payload in payloads():
+        row = [name]
+        for write in (context.write, sock.sendall):
+            try:
+                row.append(peak_kib(write, payload))
+            except Exception as exc:
+                row.append('error: %s' % type(exc).__name__)
+        rows.append(row)
+
+    tracemalloc.stop()
+    sock.close()
+
+    print("Peak KiB allocated per MiB written")
+    common.report(rows, ['buffer', 'SSLSessionContext.write', 'sendall'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the benchmarks in this directory.
+
+The benchmarks run against the stand-in ``_securetransport`` module built by
+``standin/build_standin.py``, which speaks a plaintext imitation of TLS, so
+they can run anywhere. They measure the Python layers of this package and
+how they drive SecureTransport, not the cost of the cryptography.
+
+Every benchmark takes ``--src``, the ``src`` directory of the checkout to
+measure, which defaults to this one. To compare against an earlier revision,
+check it out somewhere else (``git worktree add /tmp/before <rev>``) and pass
+``--src /tmp/before/src``. The stand-in is always built from this checkout:
+it is a superset of what earlier revisions need.
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STANDIN_BUILD_DIR = os.path.join(HERE, 'standin', '_build')
+DEFAULT_SRC = os.path.join(HERE, '..', 'src')
+
+#: The stand-in's record types, which match TLS's.
+HANDSHAKE = 22
+ALERT = 21
+APPLICATION_DATA = 23
+
+#: What the stand-in server sends in reply to the client's hello.
+SERVER_HELLO = bytes([HANDSHAKE, 3, 3, 0, 5]) + b'HELLO'
+
+MB = 1024 * 1024
+
+
+def parse_args(description, add_arguments=None):
+    """
+    Parses the common command line options, plus any added by
+    ``add_arguments``, and puts the stand-in module and the chosen source
+    tree on ``sys.path``.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--src', default=DEFAULT_SRC,
+        help="the src directory of the checkout to benchmark"
+    )
+    if add_arguments is not None:
+        add_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.isdir(STANDIN_BUILD_DIR):
+        sys.exit(
+            "The stand-in _securetransport module hasn't been built: run "
+            "python %s" % os.path.join(HERE, 'standin', 'build_standin.py')
+        )
+
+    sys.path[:0] = [STANDIN_BUILD_DIR, os.path.abspath(args.src)]
+    return args
+
+
+def configuration():
+    """
+    A TLSConfiguration that the stand-in accepts.
+    """
+    from securetransport.tls import TLSConfiguration, CipherSuite
+    return TLSConfiguration(ciphers=list(CipherSuite))
+
+
+def record(record_type, payload):
+    return struct.pack('>BHH', record_type, 0x0303, len(payload)) + payload
+
+
+def _recv_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def serve(sock, echo=True, on_record=None):
+    """
+    Runs the server side of the stand-in protocol on ``sock`` until the
+    client closes the connection or sends close_notify. Application data is
+    echoed back if ``echo`` is set, and otherwise discarded.
+    ``on_record(record_type, length)`` is called for every record received.
+    """
+    try:
+        while True:
+            header = _recv_exact(sock, 5)
+            if header is None:
+                return
+            record_type, _, length = struct.unpack('>BHH', header)
+            payload = _recv_exact(sock, length) if length else b''
+            if payload is None:
+                return
+
+            if on_record is not None:
+                on_record(record_type, length)
+
+            if record_type == HANDSHAKE:
+                sock.sendall(SERVER_HELLO)
+            elif record_type == APPLICATION_DATA and echo:
+                sock.sendall(header + payload)
+            elif record_type == ALERT:
+                sock.sendall(record(ALERT, b'\x01\x00'))
+                return
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def peer_socket(echo=True, on_record=None):
+    """
+    Returns one end of a socket pair, with the stand-in server running on
+    the other end in a thread.
+    """
+    client, server = socket.socketpair()
+    threading.Thread(
+        target=serve, args=(server, echo, on_record), daemon=True
+    ).start()
+    return client
+
+
+def listener(echo=True):
+    """
+    Starts a stand-in server on a loopback port, serving each connection in
+    a thread, and returns its address.
+    """
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(128)
+
+    def accept():
+        while True:
+            sock, _ = server.accept()
+            threading.Thread(
+                target=serve, args=(sock, echo), daemon=True
+            ).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()
+
+
+def report(rows, headings):
+    """
+    Prints ``rows`` as a simple table.
+    """
+    table = [headings] + [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(headings))]
+    for row in table:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Builds a stand-in ``_securetransport`` module for benchmarking.
+
+The module is compiled from the same cffi definitions as the real one (see
+``src/securetransport/build.py``), including the native ring-buffer I/O
+callbacks, but it links against ``fake_securetransport.c`` rather than the
+Security framework. That makes it possible to measure the Python layers of
+this package, and how often they call into SecureTransport, on platforms
+without SecureTransport.
+
+Run this once; the benchmarks import the module from ``_build``::
+
+    python bench/standin/build_standin.py
+"""
+import os
+import re
+import sys
+
+import cffi
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.path.join(HERE, '_build')
+BUILD_SCRIPT = os.path.join(
+    HERE, '..', '..', 'src', 'securetransport', 'build.py'
+)
+
+
+def _capture_definitions():
+    """
+    Runs the package's build script, capturing its C source and cdefs
+    rather than letting it configure a build.
+    """
+    captured = {'cdefs': []}
+
+    def set_source(self, module_name, source, **kwargs):
+        captured['source'] = source
+
+    def cdef(self, csource, **kwargs):
+        captured['cdefs'].append(csource)
+
+    original = cffi.FFI.set_source, cffi.FFI.cdef
+    cffi.FFI.set_source, cffi.FFI.cdef = set_source, cdef
+    try:
+        with open(BUILD_SCRIPT) as f:
+            exec(compile(f.read(), BUILD_SCRIPT, 'exec'), {})
+    finally:
+        cffi.FFI.set_source, cffi.FFI.cdef = original
+
+    return captured['source'], '\n'.join(captured['cdefs'])
+
+
+def _header_from_cdefs(cdefs):
+    """
+    Turns the cdefs into a C header declaring the Security framework API,
+    for the stand-in implementation to define.
+    """
+    # The ring buffers and native callbacks are defined by the module source
+    # itself.
+    start = cdefs.index('typedef ... st_block;')
+    end = cdefs.index('extern "Python"')
+    header = cdefs[:start] + cdefs[end:]
+
+    header = re.sub(r'extern "Python"[^;]*;', '', header, flags=re.S)
+    header = re.sub(
+        r'typedef \.\.\. \*(\w+);', r'typedef struct \1_s *\1;', header
+    )
+    header = re.sub(
+        r'typedef struct \{\s*\.\.\.;\s*\} (\w+);',
+        r'typedef struct { int unused; } \1;',
+        header
+    )
+    header = re.sub(r'(?m)^(\s*)const (\w+) (\w+);', r'\1extern const \2 \3;',
+                    header)
+    return (
+        '#include <stdbool.h>\n#include <stddef.h>\n#include <stdint.h>\n' +
+        header
+    )
+
+
+def build():
+    source, cdefs = _capture_definitions()
+    os.makedirs(BUILD_DIR, exist_ok=True)
+
+    with open(os.path.join(BUILD_DIR, 'securetransport_standin.h'), 'w') as f:
+        f.write(_header_from_cdefs(cdefs))
+
+    source = re.sub(r'#include <Security/[^>]+>\n', '', source)
+    source = '#include "securetransport_standin.h"\n' + source
+
+    ffibuilder = cffi.FFI()
+    ffibuilder.cdef(cdefs)
+    ffibuilder.set_source(
+        '_securetransport', source,
+        sources=[os.path.join(HERE, 'fake_securetransport.c')],
+        include_dirs=[BUILD_DIR],
+    )
+    return ffibuilder.compile(tmpdir=BUILD_DIR)
+
+
+if __name__ == '__main__':
+    sys.exit(print(build()))
@@ -0,0 +1,218 @@
+/*
+ * A stand-in for the parts of SecureTransport this package uses, for
+ * benchmarking on platforms without it. There is no cryptography: records
+ * are a 5-byte TLS-style header ([type:1][version:2][length:2]) followed by
+ * the plaintext, and the "handshake" is a single record each way.
+ */
+#include <stdlib.h>
+#include <string.h>
+#include "securetransport_standin.h"
+
+struct CFAllocatorRef_s { int x; };
+static struct CFAllocatorRef_s _alloc;
+const CFAllocatorRef kCFAllocatorDefault = &_alloc;
+const CFArrayCallBacks kCFTypeArrayCallBacks = {0};
+
+struct SSLContextRef_s {
+    int side;
+    SSLConnectionRef conn;
+    SSLReadFunc rf;
+    SSLWriteFunc wf;
+    int state;
+    int break_server_auth;
+    int auth_reported;
+    int hello_sent;
+    unsigned char *out; size_t out_len, out_cap;
+    unsigned char hdr[5]; size_t hdr_have;
+    unsigned char *rec; size_t rec_have, rec_len;
+    unsigned char *plain; size_t plain_len, plain_cap;
+    int closed;
+};
+
+long fake_write_calls = 0, fake_read_calls = 0, fake_records_written = 0;
+
+void CFRelease(CFTypeRef x) { }
+CFMutableArrayRef CFArrayCreateMutable(CFAllocatorRef a, CFIndex c, const CFArrayCallBacks *cb) { return (CFMutableArrayRef)malloc(8); }
+void CFArrayAppendValue(CFMutableArrayRef a, const void *v) { }
+CFDataRef CFDataCreate(CFAllocatorRef a, const UInt8 *b, CFIndex l) { return (CFDataRef)malloc(8); }
+SecCertificateRef SecCertificateCreateWithData(CFAllocatorRef a, CFDataRef d) { return (SecCertificateRef)malloc(8); }
+OSStatus SecTrustSetAnchorCertificates(SecTrustRef t, CFArrayRef a) { return 0; }
+OSStatus SecTrustSetAnchorCertificatesOnly(SecTrustRef t, Boolean b) { return 0; }
+OSStatus SecTrustEvaluate(SecTrustRef t, SecTrustResultType *r) { *r = kSecTrustResultProceed; return 0; }
+
+SSLContextRef SSLCreateContext(CFAllocatorRef a, SSLProtocolSide side, SSLConnectionType t) {
+    SSLContextRef c = calloc(1, sizeof(*c));
+    c->side = side; c->state = kSSLIdle;
+    c->rec = malloc(70000);
+    return c;
+}
+OSStatus SSLSetConnection(SSLContextRef c, SSLConnectionRef r) { c->conn = r; return 0; }
+OSStatus SSLGetConnection(SSLContextRef c, SSLConnectionRef *r) { *r = c->conn; return 0; }
+OSStatus SSLSetSessionOption(SSLContextRef c, SSLSessionOption o, Boolean v) {
+    if (o == kSSLSessionOptionBreakOnServerAuth)
+        c->break_server_auth = v;
+    return 0;
+}
+OSStatus SSLGetSessionOption(SSLContextRef c, SSLSessionOption o, Boolean *v) { *v = c->break_server_auth; return 0; }
+OSStatus SSLSetIOFuncs(SSLContextRef c, SSLReadFunc r, SSLWriteFunc w) { c->rf = r; c->wf = w; return 0; }
+OSStatus SSLSetClientSideAuthenticate(SSLContextRef c, SSLAuthenticate a) { return 0; }
+OSStatus SSLSetProtocolVersionMax(SSLContextRef c, SSLProtocol v) { return 0; }
+OSStatus SSLSetProtocolVersionMin(SSLContextRef c, SSLProtocol v) { return 0; }
+
+static void queue_record(SSLContextRef c, int type, const void *data, size_t len) {
+    if (c->out_len + len + 5 > c->out_cap) {
+        c->out_cap = (c->out_len + len + 5) * 2;
+        c->out = realloc(c->out, c->out_cap);
+    }
+    unsigned char *p = c->out + c->out_len;
+    p[0] = type; p[1] = 3; p[2] = 3; p[3] = (len >> 8) & 0xff; p[4] = len & 0xff;
+    memcpy(p + 5, data, len);
+    c->out_len += len + 5;
+    fake_records_written++;
+}
+
+static OSStatus flush(SSLContextRef c) {
+    while (c->out_len) {
+        size_t n = c->out_len;
+        fake_write_calls++;
+        OSStatus rc = c->wf(c->conn, c->out, &n);
+        if (n > c->out_len) abort();
+        memmove(c->out, c->out + n, c->out_len - n);
+        c->out_len -= n;
+        if (rc) return rc;
+        if (n == 0) return errSSLWouldBlock;
+    }
+    return 0;
+}
+
+/* Returns 0 when a full record is available in rec/rec_len (type in hdr[0]). */
+static OSStatus read_record(SSLContextRef c) {
+    while (c->hdr_have < 5) {
+        size_t n = 5 - c->hdr_have;
+        fake_read_calls++;
+        OSStatus rc = c->rf(c->conn, c->hdr + c->hdr_have, &n);
+        c->hdr_have += n;
+        if (rc) return rc;
+    }
+    c->rec_len = (c->hdr[3] << 8) | c->hdr[4];
+    while (c->rec_have < c->rec_len) {
+        size_t n = c->rec_len - c->rec_have;
+        fake_read_calls++;
+        OSStatus rc = c->rf(c->conn, c->rec + c->rec_have, &n);
+        c->rec_have += n;
+        if (rc) return rc;
+    }
+    return 0;
+}
+
+static void reset_record(SSLContextRef c) { c->hdr_have = 0; c->rec_have = 0; }
+
+OSStatus SSLHandshake(SSLContextRef c) {
+    if (c->state == kSSLConnected) return 0;
+    if (!c->hello_sent) {
+        queue_record(c, 22, "HELLO", 5);
+        c->hello_sent = 1;
+        c->state = kSSLHandshake;
+    }
+    OSStatus rc = flush(c);
+    if (rc) return rc;
+    if (!c->auth_reported) {
+        rc = read_record(c);
+        if (rc) return rc;
+        if (c->hdr[0] != 22) return errSSLProtocol;
+        reset_record(c);
+        c->auth_reported = 1;
+        if (c->break_server_auth) return errSSLServerAuthCompleted;
+    }
+    c->state = kSSLConnected;
+    return 0;
+}
+
+OSStatus SSLGetSessionState(SSLContextRef c, SSLSessionState *s) { *s = c->state; return 0; }
+OSStatus SSLGetNegotiatedProtocolVersion(SSLContextRef c, SSLProtocol *p) {
+    *p = c->state == kSSLConnected ? kTLSProtocol12 : kSSLProtocolUnknown; return 0; }
+OSStatus SSLSetPeerID(SSLContextRef c, const void *d, size_t l) { return 0; }
+OSStatus SSLGetPeerID(SSLContextRef c, const void **d, size_t *l) { *d = NULL; *l = 0; return 0; }
+OSStatus SSLGetBufferedReadSize(SSLContextRef c, size_t *s) { *s = c->plain_len; return 0; }
+
+OSStatus SSLRead(SSLContextRef c, void *buf, size_t len, size_t *processed) {
+    *processed = 0;
+    /* After close_notify, reads drain any plaintext and then keep
+       reporting a graceful close, as SecureTransport does. */
+    if (c->state != kSSLConnected && !c->closed) return errSSLClosedAbort;
+    for (;;) {
+        if (c->plain_len) {
+            size_t n = c->plain_len < len - *processed ? c->plain_len : len - *processed;
+            memcpy((char *)buf + *processed, c->plain, n);
+            memmove(c->plain, c->plain + n, c->plain_len - n);
+            c->plain_len -= n;
+            *processed += n;
+        }
+        if (*processed == len) return 0;
+        if (c->closed) return *processed ? 0 : errSSLClosedGraceful;
+        OSStatus rc = read_record(c);
+        if (rc) return rc;
+        if (c->hdr[0] == 21) { c->closed = 1; c->state = kSSLClosed; reset_record(c); continue; }
+        if (c->plain_len + c->rec_len > c->plain_cap) {
+            c->plain_cap = (c->plain_len + c->rec_len) * 2;
+            c->plain = realloc(c->plain, c->plain_cap);
+        }
+        memcpy(c->plain + c->plain_len, c->rec, c->rec_len);
+        c->plain_len += c->rec_len;
+        reset_record(c);
+        if (*processed) {
+            /* like ST: return what we have once a record is decoded */
+            size_t n = c->plain_len < len - *processed ? c->plain_len : len - *processed;
+            memcpy((char *)buf + *processed, c->plain, n);
+            memmove(c->plain, c->plain + n, c->plain_len - n);
+            c->plain_len -= n;
+            *processed += n;
+            return 0;
+        }
+    }
+}
+
+OSStatus SSLWrite(SSLContextRef c, const void *data, size_t len, size_t *processed) {
+    *processed = 0;
+    if (c->state != kSSLConnected) return errSSLClosedAbort;
+    OSStatus rc = flush(c);
+    if (rc) return rc;
+    while (*processed < len) {
+        size_t n = len - *processed;
+        if (n > 16384) n = 16384;
+        queue_record(c, 23, (const char *)data + *processed, n);
+        *processed += n;
+        rc = flush(c);
+        if (rc) return rc;
+    }
+    return 0;
+}
+
+OSStatus SSLClose(SSLContextRef c) {
+    if (c->state == kSSLConnected) { queue_record(c, 21, "\x01\x00", 2); c->state = kSSLClosed; }
+    return flush(c);
+}
+
+static SSLCipherSuite ciphers[2] = {0xC02F, 0xC030};
+OSStatus SSLGetNumberSupportedCiphers(SSLContextRef c, size_t *n) { *n = 2; return 0; }
+OSStatus SSLGetSupportedCiphers(SSLContextRef c, SSLCipherSuite *s, size_t *n) { memcpy(s, ciphers, sizeof ciphers); *n = 2; return 0; }
+OSStatus SSLSetEnabledCiphers(SSLContextRef c, const SSLCipherSuite *s, size_t n) { return 0; }
+OSStatus SSLGetNumberEnabledCiphers(SSLContextRef c, size_t *n) { *n = 2; return 0; }
+OSStatus SSLGetEnabledCiphers(SSLContextRef c, SSLCipherSuite *s, size_t *n) { memcpy(s, ciphers, sizeof ciphers); *n = 2; return 0; }
+OSStatus SSLGetNegotiatedCipher(SSLContextRef c, SSLCipherSuite *s) {
+    if (c->state != kSSLConnected)
+        return errSSLSessionNotFound;
+    *s = 0xC02F;
+    return 0;
+}
+OSStatus SSLSetDiffieHellmanParams(SSLContextRef c, const void *d, size_t l) { return 0; }
+OSStatus SSLGetDiffieHellmanParams(SSLContextRef c, const void **d, size_t *l) { *d = NULL; *l = 0; return 0; }
+OSStatus SSLSetCertificateAuthorities(SSLContextRef c, CFTypeRef t, Boolean b) { return 0; }
+OSStatus SSLCopyCertificateAuthorities(SSLContextRef c, CFArrayRef *a) { *a = NULL; return 0; }
+OSStatus SSLCopyDistinguishedNames(SSLContextRef c, CFArrayRef *a) { *a = NULL; return 0; }
+OSStatus SSLSetCertificate(SSLContextRef c, CFArrayRef a) { return 0; }
+OSStatus SSLGetClientCertificateState(SSLContextRef c, SSLClientCertificateState *s) { *s = 0; return 0; }
+OSStatus SSLCopyPeerTrust(SSLContextRef c, SecTrustRef *t) { *t = (SecTrustRef)malloc(8); return 0; }
+OSStatus SSLSetPeerDomainName(SSLContextRef c, const char *n, size_t l) { return 0; }
+OSStatus SSLGetPeerDomainNameLength(SSLContextRef c, size_t *l) { *l = 0; return 0; }
+OSStatus SSLGetPeerDomainName(SSLContextRef c, char *n, size_t *l) { *l = 0; return 0; }
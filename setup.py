@@ -12,11 +12,14 @@ setup(
     author_email="cory@lukasa.co.uk",
 
     setup_requires=[
-        "cffi>=1.4",
+        "cffi>=1.12",
     ],
     install_requires=[
-        "cffi>=1.4",
+        "cffi>=1.12",
     ],
+    extras_require={
+        "anyio": ["anyio>=3"],
+    },
 
     cffi_modules=["src/securetransport/build.py:ffibuilder"],
 
@@ -0,0 +1,734 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio support for SecureTransport.
+
+This provides a TLS transport in the style of ``asyncio.sslproto``, built on
+the buffer-level API from tlsapi, so that TLS connections can be driven by an
+event loop rather than by a thread per ``WrappedSocket``.
+
+The pieces are layered in the same way as the standard library's:
+
+- ``TLSProtocol`` is the protocol for the raw (TCP) transport. It feeds
+  ciphertext to SecureTransport and writes SecureTransport's ciphertext back
+  out.
+- ``_TLSTransport`` is the transport that the application protocol sees. It
+  reads and writes plaintext.
+
+``create_connection``, ``open_connection`` and ``start_tls`` wrap these up in
+the same shape as the event loop methods of the same names.
+"""
+import asyncio
+import collections
+import enum
+import logging
+import threading
+
+from typing import Optional, Union
+
+from .tls import WantReadError, WantWriteError, TLSError
+from .low_level import SecureTransportError, SSLErrors, READ_BUFFER_SIZE
+from .tlsapi import SecureTransportClientContext
+
+
+logger = logging.getLogger(__name__)
+
+
+#: How long to wait for a handshake to complete by default, in seconds. This
+#: matches asyncio's own TLS support.
+_HANDSHAKE_TIMEOUT = 60.0
+
+#: The size of our reads from the raw transport.
+_RECEIVE_SIZE = 64 * 1024
+
+#: The most plaintext we hand to a non-buffered protocol in one go.
+_MAX_READ = READ_BUFFER_SIZE
+
+
+class _State(enum.Enum):
+    UNWRAPPED = "UNWRAPPED"
+    HANDSHAKING = "HANDSHAKING"
+    WRAPPED = "WRAPPED"
+    SHUTDOWN = "SHUTDOWN"
+    CLOSED = "CLOSED"
+
+
+# Ciphertext from the raw transport is copied into the connection's receive
+# buffer as soon as it arrives, so every connection on a thread's event loop
+# can share one buffer to read into. That keeps per-connection memory down
+# when there are thousands of connections.
+_local = threading.local()
+
+
+def _receive_view():
+    try:
+        return _local.receive_view
+    except AttributeError:
+        view = _local.receive_view = memoryview(bytearray(_RECEIVE_SIZE))
+        return view
+
+
+def _encode_hostname(server_hostname):
+    if isinstance(server_hostname, str):
+        return server_hostname.encode('idna')
+    return server_hostname
+
+
+class _TLSTransport(asyncio.Transport):
+    """
+    The transport the application protocol sees: it takes and delivers
+    plaintext, and leaves the TLS to a TLSProtocol.
+    """
+    def __init__(self, loop, tls_protocol):
+        super().__init__()
+        self._loop = loop
+        self._tls_protocol = tls_protocol
+        self._closed = False
+
+    def get_extra_info(self, name, default=None):
+        return self._tls_protocol._get_extra_info(name, default)
+
+    def set_protocol(self, protocol):
+        self._tls_protocol._set_app_protocol(protocol)
+
+    def get_protocol(self):
+        return self._tls_protocol._app_protocol
+
+    def is_closing(self):
+        return self._closed
+
+    def close(self):
+        """
+        Closes the transport, sending close_notify to the peer. Buffered data
+        will still be sent, and then the protocol's ``connection_lost`` will be
+        called.
+        """
+        if not self._closed:
+            self._closed = True
+            self._tls_protocol._start_shutdown()
+
+    def is_reading(self):
+        return not self._closed and not self._tls_protocol._app_reading_paused
+
+    def pause_reading(self):
+        """
+        Stops delivering data to the protocol until ``resume_reading`` is
+        called. Ciphertext is held until the connection's receive high-water
+        mark is reached, at which point the raw transport stops reading too.
+        """
+        self._tls_protocol._pause_reading()
+
+    def resume_reading(self):
+        self._tls_protocol._resume_reading()
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        """
+        Sets the high- and low-water marks for write flow control. These apply
+        to the ciphertext buffered by the raw transport.
+        """
+        self._tls_protocol._transport.set_write_buffer_limits(high, low)
+
+    def get_write_buffer_limits(self):
+        return self._tls_protocol._transport.get_write_buffer_limits()
+
+    def get_write_buffer_size(self):
+        return self._tls_protocol._get_write_buffer_size()
+
+    def write(self, data):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError(
+                "data: expecting a bytes-like instance, got %s" %
+                type(data).__name__
+            )
+        if not data:
+            return
+
+        self._tls_protocol._write_appdata(data)
+
+    def can_write_eof(self):
+        return False
+
+    def write_eof(self):
+        raise NotImplementedError("TLS doesn't support half-closes")
+
+    def abort(self):
+        """
+        Closes the transport immediately, discarding buffered data and without
+        sending close_notify.
+        """
+        self._closed = True
+        self._tls_protocol._abort()
+
+
+class TLSProtocol(asyncio.BufferedProtocol):
+    """
+    Runs TLS over a raw transport, presenting the decrypted stream to
+    ``app_protocol`` through a transport of its own.
+
+    ``waiter``, if given, is a future that is resolved once the handshake has
+    completed, or failed.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                       app_protocol: asyncio.BaseProtocol,
+                       context: SecureTransportClientContext,
+                       server_hostname: Optional[Union[str, bytes]],
+                       waiter: Optional[asyncio.Future] = None,
+                       call_connection_made: bool = True,
+                       handshake_timeout: Optional[float] = None):
+        if handshake_timeout is None:
+            handshake_timeout = _HANDSHAKE_TIMEOUT
+        elif handshake_timeout <= 0:
+            raise ValueError(
+                "handshake_timeout should be a positive number, got %r" %
+                handshake_timeout
+            )
+
+        self._loop = loop
+        self._context = context
+        self._tls = context.wrap_buffers(
+            None, None, _encode_hostname(server_hostname)
+        )
+
+        # The TLS buffer tells us when it is holding too much ciphertext, and
+        # we pass that on to the raw transport.
+        self._tls.set_flow_control_callbacks(
+            self._pause_transport_reading, self._resume_transport_reading
+        )
+
+        self._app_transport = _TLSTransport(loop, self)
+        self._set_app_protocol(app_protocol)
+        self._app_connected = False
+        self._call_connection_made = call_connection_made
+        self._app_reading_paused = False
+
+        self._waiter = waiter
+        self._handshake_timeout = handshake_timeout
+        self._handshake_timeout_handle = None
+
+        # The handshake step running on the context's handshake executor, if
+        # any, and the ciphertext that has arrived while it runs. We stop
+        # reading from the raw transport once that fills the TLS buffer's
+        # receive window, as it was when the step started.
+        self._handshake_step = None
+        self._received_during_step = bytearray()
+        self._step_receive_window = 0
+        self._step_paused_reading = False
+
+        self._transport = None
+        self._state = _State.UNWRAPPED
+        self._eof_received = False
+        self._fatal_exc = None
+
+        # Plaintext we couldn't encrypt yet because SecureTransport wanted to
+        # read first. This only happens during renegotiation.
+        self._write_backlog = collections.deque()
+
+    def _set_app_protocol(self, app_protocol):
+        self._app_protocol = app_protocol
+        self._app_protocol_is_buffered = isinstance(
+            app_protocol, asyncio.BufferedProtocol
+        )
+
+    def _wakeup_waiter(self, exc=None):
+        if self._waiter is None:
+            return
+        if not self._waiter.cancelled():
+            if exc is not None:
+                self._waiter.set_exception(exc)
+            else:
+                self._waiter.set_result(None)
+        self._waiter = None
+
+    def _get_extra_info(self, name, default=None):
+        if name == 'ssl_object':
+            return self._tls
+        elif name == 'sslcontext':
+            return self._context
+        elif name == 'cipher':
+            return self._tls.cipher()
+        elif name == 'tls_version':
+            return self._tls.negotiated_tls_version()
+        elif self._transport is not None:
+            return self._transport.get_extra_info(name, default)
+        return default
+
+    def _get_write_buffer_size(self):
+        size = sum(len(data) for data in self._write_backlog)
+        if self._transport is not None:
+            size += self._transport.get_write_buffer_size()
+        return size
+
+    # asyncio.BaseProtocol methods, called by the raw transport.
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._start_handshake()
+
+    def connection_lost(self, exc):
+        self._write_backlog.clear()
+        if self._handshake_timeout_handle is not None:
+            self._handshake_timeout_handle.cancel()
+            self._handshake_timeout_handle = None
+
+        if exc is None:
+            exc = self._fatal_exc
+
+        if self._app_connected:
+            self._app_connected = False
+            self._loop.call_soon(self._app_protocol.connection_lost, exc)
+
+        self._state = _State.CLOSED
+        self._app_transport._closed = True
+        self._transport = None
+        self._wakeup_waiter(
+            exc or ConnectionResetError("Connection lost during TLS handshake")
+        )
+
+    def pause_writing(self):
+        if self._app_connected:
+            self._app_protocol.pause_writing()
+
+    def resume_writing(self):
+        if self._app_connected:
+            self._app_protocol.resume_writing()
+
+    def get_buffer(self, sizehint):
+        return _receive_view()
+
+    def buffer_updated(self, nbytes):
+        data = _receive_view()[:nbytes]
+        if self._handshake_step is not None:
+            # The TLS buffer is in use on the handshake executor.
+            self._received_during_step += data
+            if (not self._step_paused_reading and
+                    len(self._received_during_step) >=
+                    self._step_receive_window):
+                self._step_paused_reading = True
+                self._pause_transport_reading()
+            return
+
+        self._tls.receive_bytes_from_network(data)
+
+        if self._state is _State.HANDSHAKING:
+            self._do_handshake()
+        elif self._state is _State.WRAPPED:
+            self._do_read()
+            if self._write_backlog:
+                self._process_write_backlog()
+
+    def eof_received(self):
+        self._eof_received = True
+
+        if self._state is _State.HANDSHAKING:
+            self._on_handshake_complete(
+                ConnectionResetError("Connection lost during TLS handshake")
+            )
+            return False
+
+        if self._state is _State.WRAPPED:
+            # If the application has paused reading there may still be data
+            # for it to read: we'll deliver the EOF once it has.
+            if self._app_reading_paused:
+                return True
+            self._call_eof_received()
+
+        return False
+
+    # The handshake.
+
+    def _start_handshake(self):
+        self._state = _State.HANDSHAKING
+        self._handshake_timeout_handle = self._loop.call_later(
+            self._handshake_timeout, self._check_handshake_timeout
+        )
+        self._do_handshake()
+
+    def _check_handshake_timeout(self):
+        self._handshake_timeout_handle = None
+        if self._state is _State.HANDSHAKING:
+            msg = (
+                "TLS handshake is taking longer than %s seconds: "
+                "aborting the connection" % self._handshake_timeout
+            )
+            self._on_handshake_complete(ConnectionAbortedError(msg))
+
+    def _do_handshake(self):
+        if self._handshake_step is not None:
+            # The step that's running will pick up whatever has arrived.
+            return
+
+        if self._context.handshake_executor is not None:
+            self._step_receive_window = self._tls.receive_window()
+            self._handshake_step = asyncio.wrap_future(
+                self._tls.do_handshake_async(), loop=self._loop
+            )
+            self._handshake_step.add_done_callback(self._handshake_step_done)
+            return
+
+        while True:
+            try:
+                self._tls.do_handshake()
+            except Exception as exc:
+                if not self._after_handshake_step(exc):
+                    return
+            else:
+                self._after_handshake_step(None)
+                return
+
+    def _handshake_step_done(self, future):
+        self._handshake_step = None
+        if self._state is not _State.HANDSHAKING:
+            return
+
+        received = bool(self._received_during_step)
+        if received:
+            self._tls.receive_bytes_from_network(self._received_during_step)
+            self._received_during_step.clear()
+
+        # The step may have drained the TLS buffer, but it couldn't resume
+        # reading from the executor.
+        self._tls.maybe_resume_reading()
+        if self._step_paused_reading:
+            self._step_paused_reading = False
+            if not self._tls.reading_paused:
+                self._resume_transport_reading()
+
+        if future.cancelled():
+            exc = ConnectionAbortedError("TLS handshake was cancelled")
+        else:
+            exc = future.exception()
+
+        # If SecureTransport wanted more data and some arrived while it ran,
+        # it can carry on straight away.
+        retry = self._after_handshake_step(exc)
+        if retry or (isinstance(exc, WantReadError) and received):
+            self._do_handshake()
+
+    def _after_handshake_step(self, exc):
+        """
+        Acts on the outcome of a step of the handshake: ``exc`` is what it
+        raised, if anything. Returns whether another step should follow
+        straight away.
+        """
+        if isinstance(exc, WantReadError):
+            self._flush()
+            return False
+        if isinstance(exc, WantWriteError):
+            self._flush()
+            return True
+        if exc is not None:
+            self._on_handshake_complete(exc)
+            return False
+
+        self._flush()
+        self._on_handshake_complete(None)
+        return False
+
+    def _on_handshake_complete(self, exc):
+        if self._handshake_timeout_handle is not None:
+            self._handshake_timeout_handle.cancel()
+            self._handshake_timeout_handle = None
+
+        if exc is not None:
+            self._state = _State.CLOSED
+            self._wakeup_waiter(exc)
+            self._fatal_error(exc, "TLS handshake failed")
+            return
+
+        self._state = _State.WRAPPED
+        self._app_connected = True
+        if self._call_connection_made:
+            self._app_protocol.connection_made(self._app_transport)
+        self._wakeup_waiter()
+
+        # The peer may have sent application data along with the end of the
+        # handshake.
+        self._do_read()
+
+    # Reading.
+
+    def _pause_reading(self):
+        self._app_reading_paused = True
+
+    def _resume_reading(self):
+        if self._app_reading_paused:
+            self._app_reading_paused = False
+            self._loop.call_soon(self._resume_delivery)
+
+    def _resume_delivery(self):
+        if self._state is not _State.WRAPPED:
+            return
+
+        self._do_read()
+        if self._eof_received and not self._app_reading_paused:
+            self._call_eof_received()
+
+    def _pause_transport_reading(self):
+        if self._transport is not None:
+            self._transport.pause_reading()
+
+    def _resume_transport_reading(self):
+        if self._transport is not None:
+            self._transport.resume_reading()
+
+    def _do_read(self):
+        """
+        Delivers as much plaintext to the application protocol as
+        SecureTransport can decrypt from what we've received, unless the
+        application has paused reading.
+        """
+        try:
+            while not self._app_reading_paused:
+                try:
+                    if self._app_protocol_is_buffered:
+                        self._do_read_into_buffer()
+                    else:
+                        self._do_read_data()
+                except WantWriteError:
+                    # SecureTransport has something to say before it will
+                    # read any more, as in renegotiation.
+                    self._flush()
+                    continue
+                break
+        except WantReadError:
+            pass
+        except SecureTransportError as exc:
+            if exc.error_code == SSLErrors.errSSLClosedGraceful:
+                # The peer sent close_notify.
+                self._call_eof_received()
+            else:
+                self._fatal_error(exc, "Fatal error on TLS transport")
+        except Exception as exc:
+            self._fatal_error(exc, "Fatal error on TLS transport")
+
+    def _do_read_data(self):
+        while not self._app_reading_paused:
+            data = self._tls.read(_MAX_READ)
+            if not data:
+                break
+            self._app_protocol.data_received(data)
+
+    def _do_read_into_buffer(self):
+        # SecureTransport decrypts straight into the protocol's buffer.
+        while not self._app_reading_paused:
+            buffer = self._app_protocol.get_buffer(-1)
+            if not len(buffer):
+                raise RuntimeError("get_buffer() returned an empty buffer")
+
+            read = self._tls.readinto(buffer, len(buffer))
+            if not read:
+                break
+            self._app_protocol.buffer_updated(read)
+
+    def _call_eof_received(self):
+        if self._state is not _State.WRAPPED:
+            return
+
+        try:
+            keep_open = self._app_protocol.eof_received()
+        except Exception as exc:
+            self._fatal_error(exc, "Error calling eof_received()")
+            return
+
+        if keep_open:
+            logger.warning(
+                "returning true from eof_received() has no effect when "
+                "using TLS"
+            )
+        self._start_shutdown()
+
+    # Writing.
+
+    def _flush(self):
+        """
+        Hands all of SecureTransport's ciphertext to the raw transport.
+        """
+        segments = self._tls.peek_segments()
+        if not segments or self._transport is None:
+            return
+
+        # The raw transport may hold on to what we give it, and the segments
+        # point into a buffer that SecureTransport will overwrite, so this
+        # has to be a copy.
+        data = b''.join(segments)
+        self._tls.consume_bytes(len(data))
+        self._transport.write(data)
+
+    def _write_appdata(self, data):
+        if self._state is not _State.WRAPPED:
+            return
+
+        if self._write_backlog:
+            self._write_backlog.append(bytes(data))
+            return
+
+        leftover = self._do_write(memoryview(data).cast('B'))
+        if leftover is not None:
+            self._write_backlog.append(bytes(leftover))
+
+    def _do_write(self, view):
+        """
+        Encrypts ``view`` and sends the ciphertext to the raw transport.
+        Returns whatever SecureTransport wouldn't take yet, or ``None`` if it
+        took everything.
+        """
+        try:
+            while view:
+                try:
+                    written = self._tls.write(view)
+                except WantWriteError:
+                    # The TLS buffer is full: flushing it makes room.
+                    written = 0
+                self._flush()
+                view = view[written:]
+        except WantReadError:
+            return view
+        except Exception as exc:
+            self._fatal_error(exc, "Fatal error on TLS transport")
+
+        return None
+
+    def _process_write_backlog(self):
+        while self._write_backlog:
+            leftover = self._do_write(memoryview(self._write_backlog[0]))
+            if leftover is not None:
+                self._write_backlog[0] = bytes(leftover)
+                return
+            self._write_backlog.popleft()
+
+    # Closing.
+
+    def _start_shutdown(self):
+        if self._state in (_State.SHUTDOWN, _State.CLOSED):
+            return
+        if self._state is not _State.WRAPPED:
+            self._abort()
+            return
+
+        self._state = _State.SHUTDOWN
+        self._app_transport._closed = True
+        if self._write_backlog:
+            self._process_write_backlog()
+
+        try:
+            self._tls.shutdown()
+        except (WantReadError, WantWriteError):
+            # close_notify has still been written, which is all we want.
+            pass
+        except TLSError as exc:
+            logger.debug("Error sending close_notify: %r", exc)
+
+        self._flush()
+        if self._transport is not None:
+            self._transport.close()
+
+    def _abort(self):
+        self._state = _State.CLOSED
+        self._app_transport._closed = True
+        if self._transport is not None:
+            self._transport.abort()
+
+    def _fatal_error(self, exc, message="Fatal error on transport"):
+        if isinstance(exc, OSError):
+            if self._loop.get_debug():
+                logger.debug("%r: %s", self, message, exc_info=True)
+        else:
+            self._loop.call_exception_handler({
+                'message': message,
+                'exception': exc,
+                'transport': self._transport,
+                'protocol': self,
+            })
+
+        self._fatal_exc = exc
+        self._abort()
+
+
+async def create_connection(protocol_factory, host=None, port=None, *,
+                            context: SecureTransportClientContext,
+                            server_hostname=None,
+                            ssl_handshake_timeout=None,
+                            **kwargs):
+    """
+    Opens a TLS connection, like ``loop.create_connection``, with TLS provided
+    by SecureTransport. Returns a ``(transport, protocol)`` pair once the
+    handshake has completed.
+
+    ``server_hostname`` defaults to ``host``. Other keyword arguments are
+    passed through to ``loop.create_connection``.
+    """
+    loop = asyncio.get_running_loop()
+    if server_hostname is None:
+        if not host:
+            raise ValueError(
+                "You must set server_hostname when using a pre-connected "
+                "socket"
+            )
+        server_hostname = host
+
+    waiter = loop.create_future()
+    app_protocol = protocol_factory()
+    tls_protocol = TLSProtocol(
+        loop, app_protocol, context, server_hostname, waiter,
+        handshake_timeout=ssl_handshake_timeout
+    )
+    transport, _ = await loop.create_connection(
+        lambda: tls_protocol, host, port, **kwargs
+    )
+
+    try:
+        await waiter
+    except BaseException:
+        transport.close()
+        raise
+
+    return tls_protocol._app_transport, app_protocol
+
+
+async def open_connection(host=None, port=None, *,
+                          context: SecureTransportClientContext,
+                          limit=2 ** 16, **kwargs):
+    """
+    Opens a TLS connection and returns a ``(reader, writer)`` pair, like
+    ``asyncio.open_connection``. Keyword arguments are passed through to
+    ``create_connection``.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await create_connection(
+        lambda: protocol, host, port, context=context, **kwargs
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+async def start_tls(transport, protocol, context, *,
+                    server_hostname=None, ssl_handshake_timeout=None):
+    """
+    Upgrades an existing connection to TLS, like ``loop.start_tls``. Returns
+    a new transport, which ``protocol`` should use from now on in place of
+    ``transport``.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    tls_protocol = TLSProtocol(
+        loop, protocol, context, server_hostname, waiter,
+        call_connection_made=False, handshake_timeout=ssl_handshake_timeout
+    )
+
+    # Don't let the old protocol see any more data: from here on, it's all
+    # ciphertext.
+    transport.pause_reading()
+    transport.set_protocol(tls_protocol)
+    conmade_cb = loop.call_soon(tls_protocol.connection_made, transport)
+    resume_cb = loop.call_soon(transport.resume_reading)
+
+    try:
+        await waiter
+    except BaseException:
+        transport.close()
+        conmade_cb.cancel()
+        resume_cb.cancel()
+        raise
+
+    return tls_protocol._app_transport
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+anyio support for SecureTransport.
+
+This provides an anyio ``ByteStream`` that runs TLS over another byte stream,
+driving the sans-I/O buffer API from tlsapi directly, so that it works on any
+anyio backend (asyncio or Trio) without handing blocking sockets off to worker
+threads.
+
+anyio is an optional dependency: install ``securetransport[anyio]`` to use
+this module.
+"""
+from typing import Any, Callable, Mapping, Optional, Union
+
+import anyio
+from anyio.abc import ByteStream
+from anyio.streams.tls import TLSAttribute
+
+from .tls import WantReadError, WantWriteError
+from .low_level import SecureTransportError, SSLErrors
+from .tlsapi import SecureTransportClientContext
+
+
+class SecureTransportStream(ByteStream):
+    """
+    A TLS stream, wrapping another byte stream that carries the ciphertext.
+
+    Create these with :meth:`wrap`, which also performs the handshake.
+
+    All of the TLS state lives in the wrapped buffer. If an operation is
+    cancelled while it waits to receive, or for another task to finish
+    sending, anything SecureTransport has received or produced so far is
+    kept, and the next operation on the stream picks up where the cancelled
+    one left off. If a send on the wrapped stream is cancelled or fails,
+    though, there's no knowing how much of the ciphertext reached the peer,
+    so the stream is broken: anything that would send on it again raises
+    ``anyio.BrokenResourceError``.
+
+    If ``standard_compatible`` is true (the default), the peer closing the
+    connection without sending close_notify is treated as an error, and
+    :meth:`aclose` sends close_notify before closing.
+    """
+    def __init__(self, transport_stream: ByteStream, tls_buffer,
+                       standard_compatible: bool = True):
+        self.transport_stream = transport_stream
+        self.standard_compatible = standard_compatible
+        self._tls = tls_buffer
+        self._send_lock = anyio.Lock()
+        self._receive_lock = anyio.Lock()
+        self._send_broken = False
+
+    @classmethod
+    async def wrap(cls, transport_stream: ByteStream,
+                        context: SecureTransportClientContext,
+                        server_hostname: Optional[Union[str, bytes]],
+                        standard_compatible: bool = True
+                   ) -> 'SecureTransportStream':
+        """
+        Wraps ``transport_stream`` in TLS, and performs the handshake.
+        """
+        if isinstance(server_hostname, str):
+            server_hostname = server_hostname.encode('idna')
+
+        tls_buffer = context.wrap_buffers(None, None, server_hostname)
+        stream = cls(transport_stream, tls_buffer, standard_compatible)
+        await stream._call_tls_method(tls_buffer.do_handshake)
+        return stream
+
+    async def _flush(self):
+        """
+        Sends all of the ciphertext SecureTransport has produced.
+        """
+        async with self._send_lock:
+            while True:
+                if self._send_broken:
+                    raise anyio.BrokenResourceError(
+                        "An earlier send was interrupted"
+                    )
+
+                segments = self._tls.peek_segments()
+                if not segments:
+                    return
+
+                # Take the ciphertext out of the buffer before sending it.
+                # If the send is cancelled or fails, some of it may already
+                # have gone, and sending it again would corrupt the stream.
+                data = b''.join(segments)
+                self._tls.consume_bytes(len(data))
+                try:
+                    await self.transport_stream.send(data)
+                except BaseException:
+                    self._send_broken = True
+                    raise
+
+    async def _receive_ciphertext(self):
+        if self._receive_lock.locked():
+            # Another task is already receiving. Once it has, whatever we
+            # were doing may be able to go ahead without us receiving more.
+            async with self._receive_lock:
+                return
+
+        async with self._receive_lock:
+            try:
+                data = await self.transport_stream.receive()
+            except anyio.EndOfStream:
+                # The peer closed the connection without close_notify.
+                if self.standard_compatible:
+                    raise anyio.BrokenResourceError(
+                        "Connection closed without close_notify"
+                    ) from None
+                raise
+
+        self._tls.receive_bytes_from_network(data)
+
+    async def _call_tls_method(self, func: Callable, *args: Any,
+                               reading: bool = False) -> Any:
+        """
+        Calls ``func`` on the TLS buffer, doing whatever network I/O it asks
+        for until it succeeds, then sends any ciphertext it produced. Set
+        ``reading`` if ``func`` reads plaintext.
+        """
+        while True:
+            try:
+                result = func(*args)
+            except WantReadError:
+                # SecureTransport may be waiting for a reply to something it
+                # has just written. If another task is already sending, it
+                # will send that too: waiting for it could deadlock, if the
+                # peer won't read until we do.
+                if not self._send_lock.locked():
+                    await self._flush()
+                await self._receive_ciphertext()
+            except WantWriteError:
+                # The buffer reports this whenever it holds unsent ciphertext.
+                # For a read, if another task is already sending that, what
+                # SecureTransport needs from us is more data.
+                if reading and self._send_lock.locked():
+                    await self._receive_ciphertext()
+                else:
+                    await self._flush()
+            else:
+                # Reads don't produce ciphertext of their own, so anything in
+                # the buffer belongs to a send, which will flush it. A read
+                # mustn't wait on that: the peer may not read what we send
+                # until we've read what it has sent.
+                if not reading:
+                    await self._flush()
+                return result
+
+    async def receive(self, max_bytes: int = 65536) -> bytes:
+        try:
+            data = await self._call_tls_method(
+                self._tls.read, max_bytes, reading=True
+            )
+        except SecureTransportError as exc:
+            if exc.error_code == SSLErrors.errSSLClosedGraceful:
+                raise anyio.EndOfStream from None
+            raise
+
+        if not data:
+            raise anyio.EndOfStream
+        return data
+
+    async def send(self, item: bytes) -> None:
+        # The buffer only takes as much as fits below its send high-water
+        # mark, so large items are encrypted and sent a piece at a time.
+        view = memoryview(item).cast('B')
+        while view:
+            written = await self._call_tls_method(self._tls.write, view)
+            view = view[written:]
+
+    async def send_eof(self) -> None:
+        raise NotImplementedError("TLS doesn't support half-closes")
+
+    async def unwrap(self) -> ByteStream:
+        """
+        Sends close_notify, and returns the wrapped stream.
+        """
+        try:
+            self._tls.shutdown()
+        except (WantReadError, WantWriteError):
+            # close_notify has still been written, which is all we want.
+            pass
+        await self._flush()
+        return self.transport_stream
+
+    async def aclose(self) -> None:
+        # There's no sending close_notify after an interrupted send.
+        if self.standard_compatible and not self._send_broken:
+            try:
+                await self.unwrap()
+            except BaseException:
+                await anyio.aclose_forcefully(self.transport_stream)
+                raise
+
+        await self.transport_stream.aclose()
+
+    @property
+    def extra_attributes(self) -> Mapping[Any, Callable[[], Any]]:
+        return {
+            **self.transport_stream.extra_attributes,
+            TLSAttribute.server_side: lambda: False,
+            TLSAttribute.standard_compatible: lambda: self.standard_compatible,
+        }
+
+
+async def connect_tls(remote_host: str, remote_port: int, *,
+                      context: SecureTransportClientContext,
+                      server_hostname: Optional[Union[str, bytes]] = None,
+                      standard_compatible: bool = True,
+                      **kwargs) -> SecureTransportStream:
+    """
+    Opens a TCP connection with ``anyio.connect_tcp``, and wraps it in TLS.
+    ``server_hostname`` defaults to ``remote_host``. Other keyword arguments
+    are passed through to ``anyio.connect_tcp``.
+    """
+    if server_hostname is None:
+        server_hostname = remote_host
+
+    stream = await anyio.connect_tcp(remote_host, remote_port, **kwargs)
+    try:
+        return await SecureTransportStream.wrap(
+            stream, context, server_hostname, standard_compatible
+        )
+    except BaseException:
+        await anyio.aclose_forcefully(stream)
+        raise
@@ -10,9 +10,205 @@ ffibuilder.set_source(
     "_securetransport",
     """
     #include <stdlib.h>
+    #include <string.h>
     #include <Security/SecCertificate.h>
     #include <Security/SecTrust.h>
     #include <Security/SecureTransport.h>
+
+    /*
+     * Native I/O callbacks. These move ciphertext between SecureTransport and
+     * a pair of C ring buffers without ever calling back into Python. Python
+     * code then only has to push bytes from the network into the incoming
+     * ring, and pull bytes for the network out of the outgoing one.
+     */
+
+    /*
+     * A ring's storage is reference counted. The ring holds one reference,
+     * and every view Python hands out over the storage holds another, so
+     * that growing or freeing the ring never frees memory a view still
+     * points at. References may be dropped from any thread.
+     */
+    typedef struct st_block {
+        size_t refs;
+        unsigned char data[];
+    } st_block;
+
+    typedef struct {
+        unsigned char *data;
+        size_t capacity;
+        size_t start;
+        size_t length;
+        st_block *block;
+    } st_ring;
+
+    typedef struct {
+        st_ring *incoming;
+        st_ring *outgoing;
+    } st_native_io;
+
+    static st_block *st_block_new(size_t capacity)
+    {
+        st_block *block = malloc(sizeof(st_block) + capacity);
+        if (block != NULL) {
+            block->refs = 1;
+        }
+        return block;
+    }
+
+    static void st_block_release(st_block *block)
+    {
+        if (block != NULL &&
+                __atomic_sub_fetch(&block->refs, 1, __ATOMIC_ACQ_REL) == 0) {
+            free(block);
+        }
+    }
+
+    static st_block *st_ring_export(st_ring *ring)
+    {
+        __atomic_add_fetch(&ring->block->refs, 1, __ATOMIC_RELAXED);
+        return ring->block;
+    }
+
+    static st_ring *st_ring_new(size_t capacity)
+    {
+        st_ring *ring = malloc(sizeof(st_ring));
+        if (ring == NULL) {
+            return NULL;
+        }
+
+        if (capacity == 0) {
+            capacity = 1;
+        }
+
+        ring->block = st_block_new(capacity);
+        if (ring->block == NULL) {
+            free(ring);
+            return NULL;
+        }
+
+        ring->data = ring->block->data;
+        ring->capacity = capacity;
+        ring->start = 0;
+        ring->length = 0;
+        return ring;
+    }
+
+    static void st_ring_free(st_ring *ring)
+    {
+        if (ring != NULL) {
+            st_block_release(ring->block);
+            free(ring);
+        }
+    }
+
+    static void st_ring_consume(st_ring *ring, size_t length)
+    {
+        if (length >= ring->length) {
+            /* Rewinding an empty ring keeps later data contiguous. */
+            ring->start = 0;
+            ring->length = 0;
+            return;
+        }
+
+        ring->start = (ring->start + length) % ring->capacity;
+        ring->length -= length;
+    }
+
+    static size_t st_ring_read(st_ring *ring, void *buffer, size_t length)
+    {
+        size_t copied = 0;
+
+        if (length > ring->length) {
+            length = ring->length;
+        }
+
+        while (copied < length) {
+            size_t chunk = ring->capacity - ring->start;
+            if (chunk > length - copied) {
+                chunk = length - copied;
+            }
+
+            memcpy((unsigned char *)buffer + copied,
+                   ring->data + ring->start,
+                   chunk);
+            copied += chunk;
+            st_ring_consume(ring, chunk);
+        }
+
+        return copied;
+    }
+
+    static int st_ring_grow(st_ring *ring, size_t needed)
+    {
+        size_t capacity = ring->capacity;
+        size_t length = ring->length;
+        st_block *block;
+
+        while (capacity < needed) {
+            capacity *= 2;
+        }
+
+        block = st_block_new(capacity);
+        if (block == NULL) {
+            return -1;
+        }
+
+        st_ring_read(ring, block->data, length);
+        st_block_release(ring->block);
+        ring->block = block;
+        ring->data = block->data;
+        ring->capacity = capacity;
+        ring->start = 0;
+        ring->length = length;
+        return 0;
+    }
+
+    static int st_ring_append(st_ring *ring, const void *buffer, size_t length)
+    {
+        size_t end;
+        size_t first;
+
+        if (ring->length + length > ring->capacity &&
+                st_ring_grow(ring, ring->length + length) != 0) {
+            return -1;
+        }
+
+        end = (ring->start + ring->length) % ring->capacity;
+        first = ring->capacity - end;
+        if (first > length) {
+            first = length;
+        }
+
+        memcpy(ring->data + end, buffer, first);
+        memcpy(ring->data, (const unsigned char *)buffer + first, length - first);
+        ring->length += length;
+        return 0;
+    }
+
+    static OSStatus st_native_read_func(SSLConnectionRef connection,
+                                        void *data,
+                                        size_t *data_length)
+    {
+        const st_native_io *io = connection;
+        size_t wanted = *data_length;
+
+        *data_length = st_ring_read(io->incoming, data, wanted);
+        return *data_length < wanted ? errSSLWouldBlock : 0;
+    }
+
+    static OSStatus st_native_write_func(SSLConnectionRef connection,
+                                         const void *data,
+                                         size_t *data_length)
+    {
+        const st_native_io *io = connection;
+
+        if (st_ring_append(io->outgoing, data, *data_length) != 0) {
+            *data_length = 0;
+            return errSSLInternal;
+        }
+
+        return 0;
+    }
     """,
     extra_link_args=['-framework', 'Security', '-framework', 'CoreFoundation'],
 )
@@ -439,6 +635,33 @@ ffibuilder.cdef(
     OSStatus SSLGetPeerDomainNameLength(SSLContextRef, size_t *);
     OSStatus SSLGetPeerDomainName(SSLContextRef, char *, size_t *);
 
+    typedef ... st_block;
+
+    typedef struct {
+        unsigned char *data;
+        size_t capacity;
+        size_t start;
+        size_t length;
+        st_block *block;
+    } st_ring;
+
+    typedef struct {
+        st_ring *incoming;
+        st_ring *outgoing;
+    } st_native_io;
+
+    void st_block_release(st_block *);
+    st_block *st_ring_export(st_ring *);
+
+    st_ring *st_ring_new(size_t);
+    void st_ring_free(st_ring *);
+    void st_ring_consume(st_ring *, size_t);
+    size_t st_ring_read(st_ring *, void *, size_t);
+    int st_ring_append(st_ring *, const void *, size_t);
+
+    OSStatus st_native_read_func(SSLConnectionRef, void *, size_t *);
+    OSStatus st_native_write_func(SSLConnectionRef, const void *, size_t *);
+
     extern "Python" OSStatus python_read_func(SSLConnectionRef,
                                               void *,
                                               size_t*);
@@ -11,6 +11,13 @@ from _securetransport import ffi, lib
 from .tls import TLSError
 
 
+#: The size of the read buffer that each SSLSessionContext keeps for reuse.
+#: This comfortably fits the plaintext of a maximum-size TLS record. Reads
+#: of up to this size allocate nothing but the bytes they return, so callers
+#: that read in a loop should read at most this much at a time.
+READ_BUFFER_SIZE = 16384
+
+
 class CastableEnum(enum.Enum):
     def __int__(self):
         return self.value
@@ -27,6 +34,12 @@ def python_read_func(connection, data, data_length):
     context = ffi.from_handle(connection)
     func = context._read_func
 
+    if context._io_in_place:
+        # Let the callback fill SecureTransport's buffer directly.
+        view = memoryview(ffi.buffer(data, data_length[0]))
+        rc, data_length[0] = func(context.get_connection(), view)
+        return rc
+
     # We need a data buffer to write in to later.
     data = ffi.buffer(data, data_length[0])
 
@@ -48,7 +61,12 @@ def python_write_func(connection, data, data_length):
     context = ffi.from_handle(connection)
     func = context._write_func
 
-    data_to_write = ffi.buffer(data, data_length[0])[:]
+    if context._io_in_place:
+        data_to_write = memoryview(ffi.buffer(data, data_length[0]))
+        data_to_write = data_to_write.toreadonly()
+    else:
+        data_to_write = ffi.buffer(data, data_length[0])[:]
+
     rc, bytes_written = func(context.get_connection(), data_to_write)
     data_length[0] = bytes_written
     return rc
@@ -273,6 +291,18 @@ class WouldBlockError(SecureTransportError):
     pass
 
 
+_WOULD_BLOCK = lib.errSSLWouldBlock
+
+
+#: Maps OSStatus codes to the exception class to raise for them and the
+#: SSLErrors member to raise it with. Building this up front saves an enum
+#: lookup (and a caught ValueError for unknown codes) on every failure.
+_ERROR_TABLE = {
+    error.value: (SecureTransportError, error) for error in SSLErrors
+}
+_ERROR_TABLE[_WOULD_BLOCK] = (WouldBlockError, SSLErrors(_WOULD_BLOCK))
+
+
 def _raise_on_error(code):
     """
     Convert the OSStatus error to an exception. Uses the most specific one it
@@ -281,17 +311,103 @@ def _raise_on_error(code):
     if not code:
         return
 
-    if code == lib.errSSLWouldBlock:
-        exc = WouldBlockError
-    else:
-        exc = SecureTransportError
+    exc, error = _ERROR_TABLE.get(code, (SecureTransportError, code))
+    raise exc(error)
+
+
+class NativeRingBuffer(object):
+    """
+    A circular byte buffer allocated in C, used to hold ciphertext for
+    :meth:`SSLSessionContext.set_native_io`.
+
+    SecureTransport reads from and writes to these buffers directly from C,
+    so no Python code runs for each TLS record. The buffer starts at the given
+    capacity and grows (by doubling) only if an append would not otherwise
+    fit.
+    """
+    def __init__(self, capacity=65536):
+        ring = lib.st_ring_new(capacity)
+        if ring == ffi.NULL:
+            raise MemoryError("Unable to allocate ring buffer")
+        self._ring = ffi.gc(ring, lib.st_ring_free)
+
+    def __len__(self):
+        return self._ring.length
+
+    @property
+    def capacity(self):
+        return self._ring.capacity
+
+    def append(self, data):
+        """
+        Appends the contents of a buffer-protocol object to the end of the
+        buffer.
+        """
+        c_data = ffi.from_buffer(data)
+        if lib.st_ring_append(self._ring, c_data, len(c_data)):
+            raise MemoryError("Unable to grow ring buffer")
+
+    def _view(self, offset, amt):
+        """
+        Returns a memoryview over ``amt`` bytes of the buffer's storage,
+        starting ``offset`` bytes in. The view holds a reference to the
+        storage, so the memory stays allocated for as long as the view does,
+        even if the buffer grows or is freed in the meantime.
+        """
+        block = lib.st_ring_export(self._ring)
+        pointer = ffi.gc(
+            self._ring.data + offset, lambda _: lib.st_block_release(block)
+        )
+        return memoryview(ffi.buffer(pointer, amt))
+
+    def peek(self, amt):
+        """
+        Returns a memoryview over up to ``amt`` bytes from the front of the
+        buffer, without consuming them. The view is contiguous, so it may be
+        shorter than ``amt`` even if more data is buffered.
+
+        The view is always safe to read, but its contents are only
+        meaningful until the data is consumed: after that, later appends may
+        overwrite it.
+        """
+        ring = self._ring
+        amt = min(amt, ring.length, ring.capacity - ring.start)
+        return self._view(ring.start, amt)
+
+    def segments(self):
+        """
+        Returns a tuple of memoryviews that together cover all of the buffered
+        data, in order. There are at most two: one if the data is contiguous,
+        two if it wraps around the end of the buffer.
+
+        As with :meth:`peek`, the views' contents are only meaningful until
+        the data is consumed.
+        """
+        ring = self._ring
+        length = ring.length
+        first = min(length, ring.capacity - ring.start)
+        if not first:
+            return ()
+
+        head = self._view(ring.start, first)
+        if first == length:
+            return (head,)
+
+        return (head, self._view(0, length - first))
 
-    try:
-        code = SSLErrors(code)
-    except ValueError:
-        pass
+    def consume(self, amt):
+        """
+        Discards up to ``amt`` bytes from the front of the buffer.
+        """
+        lib.st_ring_consume(self._ring, amt)
 
-    raise exc(code)
+    def readinto(self, buffer):
+        """
+        Copies as many bytes as will fit from the front of the buffer into
+        ``buffer``, and consumes them. Returns the number of bytes copied.
+        """
+        c_buffer = ffi.from_buffer(buffer, require_writable=True)
+        return lib.st_ring_read(self._ring, c_buffer, len(c_buffer))
 
 
 class SSLSessionContext(object):
@@ -303,6 +419,9 @@ class SSLSessionContext(object):
         self._connection = None
         self._read_func = None
         self._write_func = None
+        self._io_in_place = False
+        self._native_io = None
+        self._native_buffers = None
         self._handle = ffi.new_handle(self)
 
         # Initialize the SSL context. In particular, we need to set it up to
@@ -312,7 +431,24 @@ class SSLSessionContext(object):
         )
         assert ctx != ffi.NULL
         self._ctx = ffi.gc(ctx, lib.CFRelease)
-
+        self._use_python_io()
+
+        # Scratch space for out-parameters and reads. Allocating these once
+        # per context means that steady-state calls don't create any cdata
+        # objects beyond the data they return. Contexts aren't safe to share
+        # between threads, so neither is this.
+        self._size_out = ffi.new("size_t *")
+        self._boolean_out = ffi.new("Boolean *")
+        self._state_out = ffi.new("SSLSessionState *")
+        self._protocol_out = ffi.new("SSLProtocol *")
+        self._cipher_out = ffi.new("SSLCipherSuite *")
+        self._read_buffer = ffi.new("char[]", READ_BUFFER_SIZE)
+
+    def _use_python_io(self):
+        """
+        Points SecureTransport at the Python I/O callbacks, which dispatch to
+        the functions registered with set_io_funcs.
+        """
         status = lib.SSLSetIOFuncs(
             self._ctx, lib.python_read_func, lib.python_write_func
         )
@@ -321,6 +457,9 @@ class SSLSessionContext(object):
         status = lib.SSLSetConnection(self._ctx, self._handle)
         _raise_on_error(status)
 
+        self._native_io = None
+        self._native_buffers = None
+
     def set_connection(self, connection):
         """
         Specifies an I/O connection for a specific session.
@@ -356,14 +495,31 @@ class SSLSessionContext(object):
         """
         Gets the current value of an SSL session option.
         """
-        value = ffi.new("Boolean *")
+        value = self._boolean_out
         status = lib.SSLGetSessionOption(self._ctx, option, value)
         _raise_on_error(status)
         return bool(value[0])
 
-    def set_io_funcs(self, read_func, write_func):
+    def set_io_funcs(self, read_func, write_func, in_place=False):
         """
         Sets the read/write functions that will be called by SecureTransport.
+
+        Both functions are called with the connection object set by
+        :meth:`set_connection` as their first argument, and must return a
+        tuple of an ``OSStatus`` (0, or ``errSSLWouldBlock`` for a short read
+        or write) and a second value that depends on the protocol in use.
+
+        By default, ``read_func`` is called with the number of bytes wanted
+        and returns the data read as ``bytes``, and ``write_func`` is called
+        with a ``bytes`` copy of the data to write and returns the number of
+        bytes written.
+
+        If ``in_place`` is ``True``, no copies are made. ``read_func`` is
+        instead called with a writable ``memoryview`` over SecureTransport's
+        own buffer, which it should fill from the front, and returns the
+        number of bytes it filled. ``write_func`` is called with a read-only
+        ``memoryview`` over the data to write. In both cases, the views are
+        only valid for the duration of the call and must not be retained.
         """
         # This doesn't translate to an SSLSetIOFuncs call because of CFFI
         # limitations that mean that there can only be one actual callback.
@@ -371,6 +527,42 @@ class SSLSessionContext(object):
         # appropriate. That means that we fake it!
         self._read_func = read_func
         self._write_func = write_func
+        self._io_in_place = in_place
+
+        if self._native_io is not None:
+            self._use_python_io()
+
+    def set_native_io(self, incoming, outgoing):
+        """
+        Sets SecureTransport up to read ciphertext from, and write ciphertext
+        to, a pair of :class:`NativeRingBuffer` objects, using I/O callbacks
+        written in C.
+
+        This avoids calling into Python for every TLS record: the caller only
+        needs to append data received from the network to ``incoming``, and
+        send data taken from ``outgoing``. A read from an empty ``incoming``
+        buffer reports ``errSSLWouldBlock``.
+
+        Calling :meth:`set_io_funcs` switches back to the Python callbacks.
+        Like :meth:`set_io_funcs`, this may only be called when no session is
+        active.
+        """
+        native_io = ffi.new("st_native_io *")
+        native_io.incoming = incoming._ring
+        native_io.outgoing = outgoing._ring
+
+        status = lib.SSLSetIOFuncs(
+            self._ctx, lib.st_native_read_func, lib.st_native_write_func
+        )
+        _raise_on_error(status)
+
+        status = lib.SSLSetConnection(self._ctx, native_io)
+        _raise_on_error(status)
+
+        # The C callbacks only hold raw pointers, so we need to keep both the
+        # connection struct and the buffers alive ourselves.
+        self._native_io = native_io
+        self._native_buffers = (incoming, outgoing)
 
     def set_client_side_authenticate(self, authenticate):
         """
@@ -433,8 +625,19 @@ class SSLSessionContext(object):
         handshake function must be called again until a different result code
         is returned.
         """
-        status = lib.SSLHandshake(self._ctx)
-        _raise_on_error(status)
+        _raise_on_error(lib.SSLHandshake(self._ctx))
+
+    def handshake_status(self):
+        """
+        Performs the SSL handshake, like :meth:`handshake`, but returns the
+        ``OSStatus`` result code rather than raising an exception for it.
+
+        There is no other result to report, so unlike the other ``_status``
+        methods this returns the status code alone.
+
+        :rtype: ``int``
+        """
+        return lib.SSLHandshake(self._ctx)
 
     def get_session_state(self):
         """
@@ -442,7 +645,7 @@ class SSLSessionContext(object):
 
         :returns: A session state enum value.
         """
-        state = ffi.new("SSLSessionState *")
+        state = self._state_out
         status = lib.SSLGetSessionState(self._ctx, state)
         _raise_on_error(status)
         return SSLSessionState(state[0])
@@ -462,7 +665,7 @@ class SSLSessionContext(object):
         - kTLSProtocol1
         - kSSLProtocolUnknown
         """
-        version = ffi.new("SSLProtocol *")
+        version = self._protocol_out
         status = lib.SSLGetNegotiatedProtocolVersion(self._ctx, version)
         _raise_on_error(status)
         return SSLProtocol(version[0])
@@ -524,23 +727,35 @@ class SSLSessionContext(object):
         in a call to the read function. This function does not block or cause
         any low-level read operations to occur.
         """
-        buffer_size = ffi.new("size_t *")
+        buffer_size = self._size_out
         status = lib.SSLGetBufferedReadSize(self._ctx, buffer_size)
         _raise_on_error(status)
         return buffer_size[0]
 
-    def read(self, size):
+    def read_status(self, size):
         """
-        Performs a normal application-level read operation.
+        Performs a normal application-level read operation, reporting errors
+        by status code rather than by exception.
+
+        This is intended for non-blocking loops, where errSSLWouldBlock is
+        the common case and raising and catching an exception for it would
+        dominate the cost of the read.
 
         :param size: The maximum number of bytes to read.
         :type size: ``int``
 
-        :returns: The read bytes.
-        :rtype: ``bytes``
+        :returns: A tuple of the ``OSStatus`` of the read (0 on success, which
+            includes short reads) and the read bytes.
+        :rtype: ``tuple`` of ``int`` and ``bytes``
         """
-        buffer = ffi.new("char[]", size)
-        read_count = ffi.new("size_t *")
+        # Small reads, which is most of them, reuse the context's read
+        # buffer. Larger ones get a buffer of their own, so that a single big
+        # read doesn't pin that much memory for the life of the context.
+        if size <= READ_BUFFER_SIZE:
+            buffer = self._read_buffer
+        else:
+            buffer = ffi.new("char[]", size)
+        read_count = self._size_out
 
         status = lib.SSLRead(self._ctx, buffer, size, read_count)
 
@@ -549,35 +764,110 @@ class SSLSessionContext(object):
         # For our case, we want to consider that as a non-error condition.
         # Short writes are just fine by us.
         read_bytes = read_count[0]
-        short_read = (status == lib.errSSLWouldBlock and read_bytes)
-        if not short_read:
-            _raise_on_error(status)
+        if status == _WOULD_BLOCK and read_bytes:
+            status = 0
 
-        return ffi.buffer(buffer, read_bytes)[:]
+        return status, ffi.buffer(buffer, read_bytes)[:]
 
-    def write(self, data):
+    def read(self, size):
         """
-        Performs a normal application-level write operation.
+        Performs a normal application-level read operation.
 
-        :returns: The number of bytes written.
+        :param size: The maximum number of bytes to read.
+        :type size: ``int``
+
+        :returns: The read bytes.
+        :rtype: ``bytes``
+        """
+        status, data = self.read_status(size)
+        _raise_on_error(status)
+        return data
+
+    def readinto_status(self, buffer, size=None):
+        """
+        Reads directly into a caller-provided buffer, like :meth:`readinto`,
+        but reports errors by status code rather than by exception.
+
+        :returns: A tuple of the ``OSStatus`` of the read (0 on success, which
+            includes short reads) and the number of bytes read.
+        :rtype: ``tuple`` of ``int`` and ``int``
+        """
+        c_buffer = ffi.from_buffer(buffer, require_writable=True)
+        if size is None or size > len(c_buffer):
+            size = len(c_buffer)
+
+        read_count = self._size_out
+        status = lib.SSLRead(self._ctx, c_buffer, size, read_count)
+
+        # As with read, a short read that reports errSSLWouldBlock is not an
+        # error for our purposes.
+        read_bytes = read_count[0]
+        if status == _WOULD_BLOCK and read_bytes:
+            status = 0
+
+        return status, read_bytes
+
+    def readinto(self, buffer, size=None):
+        """
+        Performs a normal application-level read operation directly into a
+        caller-provided buffer, avoiding any intermediate copies.
+
+        :param buffer: A writable object supporting the buffer protocol, such
+            as a ``bytearray``, ``memoryview`` or ``mmap``.
+        :param size: The maximum number of bytes to read. If ``None`` or
+            larger than ``buffer``, reads up to the length of ``buffer``.
+        :type size: ``int``
+
+        :returns: The number of bytes read.
         :rtype: ``int``
         """
-        if isinstance(data, memoryview):
-            data = data.tobytes()
+        status, read_bytes = self.readinto_status(buffer, size)
+        _raise_on_error(status)
+        return read_bytes
+
+    def write_status(self, data):
+        """
+        Performs a normal application-level write operation, reporting errors
+        by status code rather than by exception.
+
+        :returns: A tuple of the ``OSStatus`` of the write (0 on success, which
+            includes short writes) and the number of bytes written.
+        :rtype: ``tuple`` of ``int`` and ``int``
+        """
+        # CFFI can pass bytes objects directly, which saves creating a cdata
+        # wrapper for the most common case.
+        if type(data) is bytes:
+            c_data = data
+        else:
+            c_data = ffi.from_buffer(data)
 
-        write_count = ffi.new("size_t *")
-        status = lib.SSLWrite(self._ctx, data, len(data), write_count)
+        write_count = self._size_out
+        status = lib.SSLWrite(self._ctx, c_data, len(c_data), write_count)
 
         # We need to catch a weird behaviour here: Apple allows a call to
         # SSLWrite to return errSSLWouldBlock but also to have written some
         # data. For our case, we want to consider that as a non-error
         # condition. Short writes are just fine by us.
         written_bytes = write_count[0]
-        short_write = (status == lib.errSSLWouldBlock and written_bytes)
+        if status == _WOULD_BLOCK and written_bytes:
+            status = 0
 
-        if not short_write:
-            _raise_on_error(status)
+        return status, written_bytes
 
+    def write(self, data):
+        """
+        Performs a normal application-level write operation.
+
+        :param data: The data to write. May be any object supporting the
+            buffer protocol (``bytes``, ``bytearray``, ``memoryview``,
+            ``array.array``, ``mmap``, ...). The data is handed to
+            SecureTransport in place, without being copied.
+
+        :returns: The number of bytes written.
+        :rtype: ``int``
+        """
+        status, written_bytes = self.write_status(data)
+        _raise_on_error(status)
         return written_bytes
 
     def close(self):
@@ -654,7 +944,7 @@ class SSLSessionContext(object):
         :returns: The negotiated cipher.
         :rtype: Member of ``SSLCipherSuites``.
         """
-        cipher = ffi.new("SSLCipherSuite *")
+        cipher = self._cipher_out
         status = lib.SSLGetNegotiatedCipher(self._ctx, cipher)
         _raise_on_error(status)
 
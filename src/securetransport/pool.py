@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+A client-side pool of TLS connections.
+
+Every new connection costs a TCP handshake and then a TLS handshake. Clients
+that talk to the same servers over and over can instead hand connections
+back to a ``ConnectionPool`` when they're done with them, so that the next
+request to the same place reuses one and skips both handshakes.
+"""
+import socket
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Optional
+
+from .tls import TLSConfiguration, TLSError
+from .low_level import SSLSessionState
+from .tlsapi import SecureTransportClientContext, WrappedSocket
+
+
+#: How long a connection may sit idle in the pool by default, in seconds.
+_IDLE_TIMEOUT = 60.0
+
+#: The most connections the pool keeps open to one host by default.
+_MAX_PER_HOST = 10
+
+
+def _configuration_key(configuration: TLSConfiguration):
+    """
+    Returns a hashable equivalent of a TLSConfiguration, which may contain
+    lists: the default inner protocols are one.
+    """
+    return tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in configuration
+    )
+
+
+def _is_usable(connection):
+    """
+    A cheap check that an idle connection can still be used: the TLS session
+    is still open, nothing is left unread (decrypted or not), and the peer
+    hasn't closed the connection or sent anything since.
+    """
+    try:
+        if connection.sock.session_state() is not SSLSessionState.Connected:
+            return False
+        if connection.sock.pending() or connection.sock.pending_ciphertext():
+            return False
+        connection.raw.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        # Nothing to read, which is just what an idle connection should look
+        # like.
+        return True
+    except (OSError, TLSError):
+        return False
+
+    # Either the peer has closed the connection, or it has sent something,
+    # such as close_notify, that the last user of the connection didn't ask
+    # for.
+    return False
+
+
+class PoolStats:
+    """
+    Counters for the connections a :class:`ConnectionPool` has handed out.
+
+    ``hits`` counts requests served by reusing a pooled connection, and
+    ``handshakes`` counts new connections. ``dropped`` counts idle
+    connections that failed the liveness check, and ``expired`` counts those
+    closed for being idle too long.
+    """
+    __slots__ = ('requests', 'hits', 'handshakes', 'dropped', 'expired')
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.handshakes = 0
+        self.dropped = 0
+        self.expired = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of requests served by a pooled connection.
+        """
+        if not self.requests:
+            return 0.0
+        return self.hits / self.requests
+
+    @property
+    def handshakes_avoided(self) -> int:
+        """
+        The number of TCP and TLS handshakes the pool has saved: one for each
+        hit.
+        """
+        return self.hits
+
+    def __repr__(self):
+        fields = ', '.join(
+            '%s=%d' % (name, getattr(self, name)) for name in self.__slots__
+        )
+        return 'PoolStats(%s)' % fields
+
+
+class _PooledConnection:
+    __slots__ = ('key', 'sock', 'raw', 'released_at')
+
+    def __init__(self, key, sock, raw):
+        self.key = key
+        self.sock = sock
+        self.raw = raw
+        self.released_at = 0.0
+
+
+class ConnectionPool:
+    """
+    A pool of client TLS connections, keyed by host, port and
+    TLSConfiguration.
+
+    ``get`` hands out an idle connection with the same key if there is one,
+    most recently used first, and otherwise opens a new one. Hand connections
+    back with ``put`` once done with them, or with ``discard`` if they
+    mustn't be reused; ``connection`` does this for you.
+
+    At most ``max_per_host`` connections, in use or idle, are kept open for
+    each key: once that many are in use, ``get`` waits for one to be handed
+    back. Connections that have been idle for ``idle_timeout`` seconds are
+    closed rather than reused. Before reusing a connection, the pool checks
+    that SecureTransport still considers the session connected and peeks at
+    the socket, without blocking, to make sure the peer hasn't closed it.
+
+    The pool is safe to use from several threads.
+    """
+    def __init__(self, max_per_host: int = _MAX_PER_HOST,
+                       idle_timeout: float = _IDLE_TIMEOUT):
+        if max_per_host <= 0:
+            raise ValueError("max_per_host must be positive")
+        if idle_timeout <= 0:
+            raise ValueError("idle_timeout must be positive")
+
+        self._max_per_host = max_per_host
+        self._idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        self._closed = False
+        self.stats = PoolStats()
+
+        # Idle connections for each key, the most recently used last.
+        self._idle = {}
+
+        # The number of open connections for each key, in use or idle.
+        self._counts = {}
+
+        # Connections that have been handed out, by id of the WrappedSocket.
+        self._in_use = {}
+
+    def __len__(self):
+        """
+        The number of connections open, in use or idle.
+        """
+        with self._condition:
+            return sum(self._counts.values())
+
+    def get(self, host: str, port: int,
+                  context: SecureTransportClientContext,
+                  timeout: Optional[float] = None) -> WrappedSocket:
+        """
+        Returns a connection to ``host`` and ``port`` using ``context``,
+        reusing an idle one if possible. The handshake has already been done.
+
+        ``timeout`` is the socket timeout for the connection. It also bounds
+        how long to wait to connect, and to wait for a connection if there are
+        already ``max_per_host`` in use.
+        """
+        key = (host, port, _configuration_key(context.configuration))
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        discarded = []
+        try:
+            with self._condition:
+                if self._closed:
+                    raise ValueError("Connection pool is closed")
+
+                self.stats.requests += 1
+                while True:
+                    connection = self._pop_idle(key, discarded)
+                    if discarded:
+                        self._condition.notify_all()
+                    if connection is not None:
+                        self.stats.hits += 1
+                        self._in_use[id(connection.sock)] = connection
+                        connection.sock.settimeout(timeout)
+                        return connection.sock
+
+                    count = self._counts.get(key, 0)
+                    if count < self._max_per_host:
+                        # Claim the slot now: the new connection goes in it.
+                        self._counts[key] = count + 1
+                        break
+
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise socket.timeout(
+                                "Timed out waiting for a pooled connection"
+                            )
+                    self._condition.wait(remaining)
+        finally:
+            for connection in discarded:
+                connection.sock.close()
+
+        try:
+            connection = self._connect(key, host, port, context, timeout)
+        except BaseException:
+            with self._condition:
+                self._forget(key)
+            raise
+
+        with self._condition:
+            self.stats.handshakes += 1
+            self._in_use[id(connection.sock)] = connection
+        return connection.sock
+
+    def put(self, sock: WrappedSocket) -> None:
+        """
+        Hands a connection from ``get`` back to the pool for reuse. Only hand
+        back connections that are ready for another request: anything the
+        server sent must have been read. Connections that have been closed,
+        or that fail the liveness check, are closed and forgotten.
+        """
+        with self._condition:
+            connection = self._take(sock)
+            reuse = not self._closed and _is_usable(connection)
+            if reuse:
+                connection.released_at = time.monotonic()
+                self._idle.setdefault(connection.key, []).append(connection)
+            else:
+                self._forget(connection.key)
+            self._condition.notify_all()
+
+        if not reuse:
+            sock.close()
+
+    def discard(self, sock: WrappedSocket) -> None:
+        """
+        Closes a connection from ``get``, rather than handing it back for
+        reuse: for example, after an error.
+        """
+        with self._condition:
+            connection = self._take(sock)
+            self._forget(connection.key)
+            self._condition.notify_all()
+
+        sock.close()
+
+    @contextmanager
+    def connection(self, host: str, port: int,
+                         context: SecureTransportClientContext,
+                         timeout: Optional[float] = None):
+        """
+        A context manager that gets a connection, and hands it back at the
+        end of the block. If the block raises, the connection is discarded.
+        """
+        sock = self.get(host, port, context, timeout)
+        try:
+            yield sock
+        except BaseException:
+            self.discard(sock)
+            raise
+        self.put(sock)
+
+    def prune(self) -> int:
+        """
+        Closes every connection that has been idle for longer than the idle
+        timeout, and returns how many were closed. Idle connections are also
+        pruned as they're looked at by ``get``, so this is only needed to
+        release connections to hosts that are no longer being used.
+        """
+        discarded = []
+        with self._condition:
+            now = time.monotonic()
+            for key in list(self._idle):
+                self._expire(key, now, discarded)
+            if discarded:
+                self._condition.notify_all()
+
+        for connection in discarded:
+            connection.sock.close()
+        return len(discarded)
+
+    def close(self) -> None:
+        """
+        Closes every idle connection. Connections in use are closed as they're
+        handed back, and ``get`` can no longer be called.
+        """
+        with self._condition:
+            self._closed = True
+            discarded = []
+            for key, stack in self._idle.items():
+                discarded.extend(stack)
+                for _ in stack:
+                    self._forget(key)
+            self._idle.clear()
+            self._condition.notify_all()
+
+        for connection in discarded:
+            connection.sock.close()
+
+    def _connect(self, key, host, port, context, timeout):
+        raw = socket.create_connection((host, port), timeout)
+        try:
+            sock = context.wrap_socket(
+                raw, server_hostname=host.encode('idna')
+            )
+            sock.do_handshake()
+        except BaseException:
+            raw.close()
+            raise
+
+        return _PooledConnection(key, sock, raw)
+
+    def _take(self, sock):
+        try:
+            return self._in_use.pop(id(sock))
+        except KeyError:
+            raise ValueError("Connection was not handed out by this pool")
+
+    def _forget(self, key):
+        """
+        Gives up one of the slots for ``key``.
+        """
+        count = self._counts[key] - 1
+        if count:
+            self._counts[key] = count
+        else:
+            del self._counts[key]
+
+    def _expire(self, key, now, discarded):
+        """
+        Moves the connections for ``key`` that have been idle too long to
+        ``discarded``.
+        """
+        stack = self._idle[key]
+
+        # The stack is in order of use, so the connections that have been idle
+        # longest are at the bottom.
+        expired = 0
+        while (expired < len(stack) and
+                now - stack[expired].released_at >= self._idle_timeout):
+            expired += 1
+
+        if expired:
+            discarded.extend(stack[:expired])
+            del stack[:expired]
+            self.stats.expired += expired
+            for _ in range(expired):
+                self._forget(key)
+        if not stack:
+            del self._idle[key]
+
+    def _pop_idle(self, key, discarded):
+        """
+        Takes the most recently used idle connection for ``key`` that is
+        still usable, if there is one. Connections that aren't are moved to
+        ``discarded``.
+        """
+        if key not in self._idle:
+            return None
+
+        self._expire(key, time.monotonic(), discarded)
+        stack = self._idle.get(key, ())
+        connection = None
+        while stack:
+            candidate = stack.pop()
+            if _is_usable(candidate):
+                connection = candidate
+                break
+
+            self.stats.dropped += 1
+            self._forget(key)
+            discarded.append(candidate)
+
+        if not stack:
+            self._idle.pop(key, None)
+        return connection
@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+A reactor that drives many TLS connections from one thread.
+
+Each ``WrappedSocket`` is usually driven by whoever calls ``recv``/``send``
+on it, blocking as it goes, which means a thread per connection. The
+``Reactor`` instead puts its sockets in non-blocking mode, registers them all
+with a single selector (epoll, on Linux), and performs handshakes, reads and
+writes for whichever are ready, handing decrypted data to per-connection
+callbacks. Handshake, idle and read deadlines for every connection are kept
+on one TimerWheel.
+"""
+import collections
+import errno
+import os
+import selectors
+import socket
+
+from typing import Any, Callable, Optional
+
+from .tls import WantReadError, WantWriteError, TLSError
+from .low_level import SecureTransportError, SSLErrors, READ_BUFFER_SIZE
+from .tlsapi import SecureTransportClientContext, WrappedSocket
+from .timers import TimerWheel
+
+
+#: The most plaintext we read from a connection in one go.
+_READ_SIZE = READ_BUFFER_SIZE
+
+
+def _ignore(*args):
+    pass
+
+
+class ReactorConnection:
+    """
+    A TLS connection being driven by a Reactor.
+
+    The callbacks are ``on_connect(connection)``, once the handshake has
+    completed; ``on_data(connection, data)``, with each chunk of plaintext
+    that arrives; and ``on_close(connection, exc)``, once the connection has
+    closed, where ``exc`` is ``None`` for a clean close.
+    """
+    def __init__(self, reactor, sock, on_connect, on_data, on_close):
+        self.socket = sock
+        self.on_connect = on_connect or _ignore
+        self.on_data = on_data or _ignore
+        self.on_close = on_close or _ignore
+
+        self._reactor = reactor
+        self._fileno = sock.fileno() if sock is not None else -1
+        self._events = 0
+        self._handshaking = True
+        self._closing = False
+        self._closed = False
+
+        # While the TCP connection is being opened by Reactor.connect, the
+        # addresses left to try, the context and the server hostname.
+        self._connecting = None
+
+        # Plaintext waiting to be sent, as memoryviews over the caller's data.
+        self._outgoing = collections.deque()
+
+        # Whether the socket is holding ciphertext it couldn't send yet.
+        self._unflushed = False
+
+        # Deadlines, as timers on the reactor's TimerWheel.
+        self._handshake_timer = None
+        self._idle_timer = None
+        self._read_timer = None
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the handshake has completed, and the connection isn't closed.
+        """
+        return not self._handshaking and not self._closed
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def send(self, data: Any) -> None:
+        """
+        Queues ``data`` to be sent. This never blocks: the data is sent as the
+        socket becomes writable. Data sent before the handshake completes is
+        held until it has.
+        """
+        if self._closing or self._closed:
+            raise ValueError("Connection is closed")
+
+        view = memoryview(data).cast('B')
+        if view:
+            self._outgoing.append(view)
+            self._reactor._update_events(self)
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        """
+        Closes the connection with ``socket.timeout`` unless some data arrives
+        within ``timeout`` seconds, for example when waiting for a response.
+        The timeout is disarmed by the next data to arrive, or by passing
+        ``None``.
+        """
+        if self._read_timer is not None:
+            self._read_timer.cancel()
+            self._read_timer = None
+
+        if timeout is not None and not self._closed:
+            self._read_timer = self._reactor.timers.schedule(
+                timeout, self._reactor._timed_out, self, "Read timed out"
+            )
+
+    def close(self) -> None:
+        """
+        Closes the connection once everything queued by ``send`` has been
+        sent.
+        """
+        if self._closing or self._closed:
+            return
+
+        self._closing = True
+        self._reactor._update_events(self)
+
+    def abort(self) -> None:
+        """
+        Closes the connection immediately, discarding anything queued.
+        """
+        self._reactor._close(self, None)
+
+
+class Reactor:
+    """
+    Drives a set of TLS connections using a single selector.
+
+    Register connected ``WrappedSocket`` objects with ``register``, or open
+    new connections with ``connect``, then call ``run_once`` or ``run`` from
+    one thread. Callbacks are called from that thread. If a callback raises,
+    its connection is closed with that exception.
+
+    If ``handshake_timeout`` is set, connections that haven't completed their
+    handshake within that many seconds of being registered are closed with
+    ``socket.timeout``. Likewise, if ``idle_timeout`` is set, connections are
+    closed once they've gone that long without sending or receiving
+    anything. Timers are checked once per ``run_once``.
+    """
+    def __init__(self, selector: Optional[selectors.BaseSelector] = None,
+                       handshake_timeout: Optional[float] = None,
+                       idle_timeout: Optional[float] = None,
+                       timers: Optional[TimerWheel] = None):
+        if selector is None:
+            selector = selectors.DefaultSelector()
+        if timers is None:
+            timers = TimerWheel()
+        self._selector = selector
+        self._connections = {}
+        self._handshake_timeout = handshake_timeout
+        self._idle_timeout = idle_timeout
+        self.timers = timers
+
+    def __len__(self):
+        return len(self._connections)
+
+    def register(self, sock: WrappedSocket,
+                       on_connect: Optional[Callable] = None,
+                       on_data: Optional[Callable] = None,
+                       on_close: Optional[Callable] = None
+                 ) -> ReactorConnection:
+        """
+        Starts driving ``sock``, which is switched to non-blocking mode. The
+        handshake starts straight away.
+        """
+        sock.settimeout(0)
+        connection = ReactorConnection(
+            self, sock, on_connect, on_data, on_close
+        )
+        self._connections[connection._fileno] = connection
+        self._start_handshake_timer(connection)
+        self._service(connection)
+        return connection
+
+    def connect(self, address, context: SecureTransportClientContext,
+                      server_hostname: Optional[bytes],
+                      on_connect: Optional[Callable] = None,
+                      on_data: Optional[Callable] = None,
+                      on_close: Optional[Callable] = None
+                ) -> ReactorConnection:
+        """
+        Opens a TCP connection to ``address``, a ``(host, port)`` pair,
+        without blocking, and starts the handshake once it's established.
+        Each of the host's addresses is tried in turn, and if none of them
+        can be connected to, ``on_close`` is called with the last error. The
+        handshake timeout, if any, covers opening the connection too.
+
+        The host is resolved with ``getaddrinfo``, which blocks every
+        connection on the reactor until it returns. Pass an IP address, and
+        resolve names beforehand (in a thread, say), to avoid that.
+        """
+        host, port = address[:2]
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+        connection = ReactorConnection(
+            self, None, on_connect, on_data, on_close
+        )
+        connection._connecting = (
+            collections.deque(addresses), context, server_hostname
+        )
+        self._start_handshake_timer(connection)
+        self._connect_next(connection, None)
+        return connection
+
+    def run_once(self, timeout: Optional[float] = None) -> int:
+        """
+        Waits up to ``timeout`` seconds for any connections to become ready,
+        and services them. Returns the number of connections serviced.
+        """
+        if not self._connections:
+            return 0
+
+        # Don't sleep past the next timer tick.
+        timer_timeout = self.timers.next_timeout()
+        if timer_timeout is not None:
+            if timeout is None or timer_timeout < timeout:
+                timeout = timer_timeout
+
+        events = self._selector.select(timeout)
+        for key, _ in events:
+            connection = key.data
+            if not connection._closed:
+                self._service(connection)
+
+        self.timers.expire()
+        return len(events)
+
+    def run(self) -> None:
+        """
+        Services connections until there are none left.
+        """
+        while self._connections:
+            self.run_once()
+
+    def close(self) -> None:
+        """
+        Aborts every connection, and closes the selector.
+        """
+        for connection in list(self._connections.values()):
+            self._close(connection, None)
+        self._selector.close()
+
+    def _service(self, connection):
+        """
+        Does all the work a connection has ready: handshaking, then writing
+        and reading. Afterwards, waits for whichever direction it's blocked
+        on.
+        """
+        try:
+            if connection._connecting is not None:
+                self._finish_connect(connection)
+                if connection._connecting is not None or connection._closed:
+                    return
+
+            sock = connection.socket
+            if connection._handshaking:
+                try:
+                    sock.do_handshake()
+                except WantReadError:
+                    self._set_events(connection, selectors.EVENT_READ)
+                    return
+                except WantWriteError:
+                    self._set_events(connection, selectors.EVENT_WRITE)
+                    return
+
+                connection._handshaking = False
+                if connection._handshake_timer is not None:
+                    connection._handshake_timer.cancel()
+                    connection._handshake_timer = None
+                self._touch(connection)
+                connection.on_connect(connection)
+
+            self._write(connection)
+            if connection._closed:
+                return
+
+            self._read(connection)
+            if connection._closed:
+                return
+
+            if (connection._closing and not connection._outgoing and
+                    not connection._unflushed):
+                self._close(connection, None)
+                return
+        except Exception as exc:
+            self._close(connection, exc)
+            return
+
+        self._update_events(connection)
+
+    def _start_handshake_timer(self, connection):
+        if self._handshake_timeout is not None:
+            connection._handshake_timer = self.timers.schedule(
+                self._handshake_timeout, self._timed_out, connection,
+                "TLS handshake timed out"
+            )
+
+    def _connect_next(self, connection, exc):
+        """
+        Starts connecting to the next of a connection's addresses, giving up
+        on the one it was connecting to, if any. If there are none left, the
+        connection is closed with ``exc``.
+        """
+        if connection.socket is not None:
+            if connection._events:
+                self._selector.unregister(connection._fileno)
+                connection._events = 0
+            self._connections.pop(connection._fileno, None)
+            connection.socket.close()
+
+        addresses = connection._connecting[0]
+        while addresses:
+            family, type_, proto, _, sockaddr = addresses.popleft()
+            try:
+                raw = socket.socket(family, type_, proto)
+            except OSError as e:
+                exc = e
+                continue
+
+            raw.setblocking(False)
+            connection.socket = raw
+            connection._fileno = raw.fileno()
+
+            err = raw.connect_ex(sockaddr)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                exc = OSError(err, os.strerror(err))
+                raw.close()
+                continue
+
+            # We can't start the handshake until the connection has been
+            # established: on some platforms, sending on a socket that's
+            # still connecting fails with ENOTCONN rather than EAGAIN.
+            self._connections[connection._fileno] = connection
+            self._set_events(connection, selectors.EVENT_WRITE)
+            return
+
+        self._close(connection, exc)
+
+    def _finish_connect(self, connection):
+        """
+        Once a connecting socket is writable, checks whether the connection
+        succeeded and, if it did, wraps the socket ready for the handshake.
+        """
+        raw = connection.socket
+        err = raw.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self._connect_next(connection, OSError(err, os.strerror(err)))
+            return
+
+        _, context, server_hostname = connection._connecting
+        connection._connecting = None
+        sock = context.wrap_socket(raw, server_hostname=server_hostname)
+        sock.settimeout(0)
+        connection.socket = sock
+
+    def _touch(self, connection):
+        """
+        Pushes back a connection's idle deadline.
+        """
+        if self._idle_timeout is None or connection._closed:
+            return
+
+        if connection._idle_timer is not None:
+            connection._idle_timer.cancel()
+        connection._idle_timer = self.timers.schedule(
+            self._idle_timeout, self._timed_out, connection,
+            "Connection idle timed out"
+        )
+
+    def _timed_out(self, connection, message):
+        self._close(connection, socket.timeout(message))
+
+    def _write(self, connection):
+        sock = connection.socket
+        outgoing = connection._outgoing
+        try:
+            while outgoing:
+                view = outgoing[0]
+                sent = sock.send(view)
+                self._touch(connection)
+                if sent < len(view):
+                    outgoing[0] = view[sent:]
+                else:
+                    outgoing.popleft()
+
+            # send keeps ciphertext it couldn't get onto the network.
+            sock.flush()
+        except WantWriteError:
+            connection._unflushed = True
+        else:
+            connection._unflushed = False
+
+    def _read(self, connection):
+        sock = connection.socket
+        while not connection._closed:
+            try:
+                data = sock.recv(_READ_SIZE)
+            except WantReadError:
+                return
+            except SecureTransportError as exc:
+                if exc.error_code != SSLErrors.errSSLClosedGraceful:
+                    raise
+                data = b''
+
+            if not data:
+                # The peer has closed the connection.
+                self._close(connection, None)
+                return
+
+            self._touch(connection)
+            if connection._read_timer is not None:
+                connection._read_timer.cancel()
+                connection._read_timer = None
+            connection.on_data(connection, data)
+
+    def _update_events(self, connection):
+        if connection._closed or connection._handshaking:
+            return
+
+        # A closing connection waits to be writable even with nothing left to
+        # send, so that it's serviced, and closed, without waiting for data
+        # to arrive.
+        events = selectors.EVENT_READ
+        if (connection._outgoing or connection._unflushed or
+                connection._closing):
+            events |= selectors.EVENT_WRITE
+        self._set_events(connection, events)
+
+    def _set_events(self, connection, events):
+        if events == connection._events:
+            return
+
+        if not connection._events:
+            self._selector.register(connection._fileno, events, connection)
+        else:
+            self._selector.modify(connection._fileno, events, connection)
+        connection._events = events
+
+    def _close(self, connection, exc):
+        if connection._closed:
+            return
+
+        connection._closed = True
+        connection._outgoing.clear()
+        for timer in (connection._handshake_timer, connection._idle_timer,
+                      connection._read_timer):
+            if timer is not None:
+                timer.cancel()
+        connection._handshake_timer = None
+        connection._idle_timer = None
+        connection._read_timer = None
+        if connection._events:
+            self._selector.unregister(connection._fileno)
+            connection._events = 0
+        self._connections.pop(connection._fileno, None)
+
+        try:
+            connection.socket.close()
+        except (OSError, TLSError):
+            pass
+
+        connection.on_close(connection, exc)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+A hashed timer wheel, for tracking large numbers of connection deadlines.
+
+Scheduling and cancelling a timer are O(1), which matters when every read on
+every one of thousands of connections pushes back an idle deadline. The
+price is resolution: timers fire on the first tick at or after their
+deadline, so they may be up to one tick late, but never early.
+"""
+import math
+import time
+
+from typing import Any, Callable, List, Optional
+
+
+class Timer:
+    """
+    A handle for a scheduled callback. Use ``cancel`` to unschedule it.
+    """
+    __slots__ = ('deadline', '_tick', '_callback', '_args', '_wheel')
+
+    def __init__(self, wheel, deadline, tick, callback, args):
+        self.deadline = deadline
+        self._tick = tick
+        self._callback = callback
+        self._args = args
+        self._wheel = wheel
+
+    @property
+    def active(self) -> bool:
+        """
+        Whether the timer is still scheduled: it hasn't fired, and hasn't been
+        cancelled.
+        """
+        return self._wheel is not None
+
+    def cancel(self) -> None:
+        if self._wheel is not None:
+            self._wheel._remove(self)
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel: a ring of ``slots`` buckets, each covering ``tick``
+    seconds. A timer goes in the bucket for the tick its deadline falls in,
+    modulo the size of the ring, and timers more than a full turn of the
+    wheel away just stay put until their turn comes round.
+
+    Call ``expire`` once per loop iteration to fire every timer that is due,
+    and use ``next_timeout`` to bound how long the loop waits for I/O.
+    """
+    def __init__(self, tick: float = 0.1, slots: int = 512,
+                       clock: Callable[[], float] = time.monotonic):
+        if tick <= 0:
+            raise ValueError("tick must be positive")
+        if slots <= 0:
+            raise ValueError("slots must be positive")
+
+        self._tick = tick
+        self._clock = clock
+        self._buckets = [set() for _ in range(slots)]
+        self._count = 0
+
+        # The last tick we've expired timers for.
+        self._current_tick = self._tick_for(clock())
+
+    def __len__(self):
+        return self._count
+
+    def _tick_for(self, when):
+        return math.floor(when / self._tick)
+
+    def schedule(self, delay: float, callback: Callable,
+                       *args: Any) -> Timer:
+        """
+        Arranges for ``callback(*args)`` to be called by ``expire`` once
+        ``delay`` seconds have passed.
+        """
+        deadline = self._clock() + delay
+
+        # A timer is due once the tick its deadline falls in has ended, and
+        # it must never land in a tick we've already expired.
+        tick = max(self._tick_for(deadline) + 1, self._current_tick + 1)
+        timer = Timer(self, deadline, tick, callback, args)
+        self._buckets[tick % len(self._buckets)].add(timer)
+        self._count += 1
+        return timer
+
+    def _remove(self, timer):
+        self._buckets[timer._tick % len(self._buckets)].discard(timer)
+        timer._wheel = None
+        self._count -= 1
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Fires every timer whose deadline has passed, in deadline order, and
+        returns how many fired. If a callback raises, the exception
+        propagates, and any due timers that hadn't fired yet fire on the
+        next tick instead.
+        """
+        if now is None:
+            now = self._clock()
+        now_tick = self._tick_for(now)
+        if now_tick <= self._current_tick:
+            return 0
+
+        # Gather everything that is due before calling any callbacks, so
+        # that callbacks can freely schedule and cancel timers. Gathered
+        # timers stay active until they fire, so that a callback can still
+        # cancel one that is due later in the batch.
+        due = []  # type: List[Timer]
+        buckets = self._buckets
+        first = self._current_tick + 1
+        last = min(now_tick, self._current_tick + len(buckets))
+        for tick in range(first, last + 1):
+            bucket = buckets[tick % len(buckets)]
+            if not bucket:
+                continue
+
+            expired = [timer for timer in bucket if timer._tick <= now_tick]
+            bucket.difference_update(expired)
+            due.extend(expired)
+
+        self._current_tick = now_tick
+
+        due.sort(key=lambda timer: timer.deadline)
+        fired = 0
+        for index, timer in enumerate(due):
+            if timer._wheel is not self:
+                # An earlier callback cancelled it.
+                continue
+
+            timer._wheel = None
+            self._count -= 1
+            fired += 1
+            try:
+                timer._callback(*timer._args)
+            except BaseException:
+                # Leave whatever we haven't got to yet for the next tick.
+                for remaining in due[index + 1:]:
+                    if remaining._wheel is self:
+                        remaining._tick = now_tick + 1
+                        buckets[remaining._tick % len(buckets)].add(remaining)
+                raise
+        return fired
+
+    def next_timeout(self) -> Optional[float]:
+        """
+        Returns how long until the next tick, or ``None`` if there are no
+        timers: the longest a loop can wait before calling ``expire``.
+        """
+        if not self._count:
+            return None
+
+        next_tick = (self._current_tick + 1) * self._tick
+        return max(next_tick - self._clock(), 0)
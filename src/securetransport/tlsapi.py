@@ -10,6 +10,10 @@ https://github.com/curl/curl/blob/master/lib/vtls/darwinssl.c
 from typing import Optional, Any, Union
 
 import base64
+import concurrent.futures
+import io
+import mmap
+import os
 import re
 import selectors
 import socket
@@ -25,10 +29,45 @@ from .tls import (
 from .low_level import (
     SSLSessionContext, SSLProtocolSide, SSLConnectionType, SSLSessionState,
     SecureTransportError, WouldBlockError, SSLErrors, SSLProtocol,
-    SSLSessionOption, SSLProtocol, certificate_array_from_der_bytes
+    SSLSessionOption, SSLProtocol, NativeRingBuffer,
+    certificate_array_from_der_bytes, _raise_on_error
 )
 
 
+_WOULD_BLOCK = SSLErrors.errSSLWouldBlock.value
+_SERVER_AUTH_COMPLETED = SSLErrors.errSSLServerAuthCompleted.value
+
+
+#: The largest TLS record a peer may send us: 16 KiB of plaintext, up to
+#: 2 KiB of expansion from compression, padding and MAC, and the 5-byte
+#: record header. Network reads are at least this big, so that one syscall
+#: can always pick up a whole record.
+_MAX_RECORD_SIZE = 16384 + 2048 + 5
+
+#: The most plaintext a single TLS record can carry.
+_MAX_RECORD_PLAINTEXT = 16384
+
+#: The largest single network read we'll grow to.
+_MAX_RECEIVE_SIZE = 256 * 1024
+
+#: How many network reads in a row must fill the read buffer before it
+#: doubles, and how many in a row must use at most a quarter of it before it
+#: halves again. See WrappedSocket._do_read.
+_RECEIVE_GROW_AFTER = 2
+_RECEIVE_SHRINK_AFTER = 8
+
+#: The default amount of ciphertext a connection will buffer before writes
+#: start raising WantWriteError.
+_SEND_HIGH_WATER_MARK = 64 * 1024
+
+#: The default amount of received ciphertext a connection will buffer before
+#: it asks to stop reading from the network.
+_RECEIVE_HIGH_WATER_MARK = 256 * 1024
+
+#: How much of a file sendfile maps into memory at once.
+_SENDFILE_WINDOW = 8 * 1024 * 1024
+
+
 _CERTS_RE = re.compile(
     rb"-----BEGIN CERTIFICATE-----\n(.*?)\n-----END CERTIFICATE-----", re.DOTALL
 )
@@ -52,6 +91,9 @@ def _ssl_protocol_from_tls_version(version):
 
 
 class _Deadline:
+    """
+    The deadline for a whole socket operation, however many waits it takes.
+    """
     def __init__(self, total_time):
         self._total_time = total_time
 
@@ -62,12 +104,12 @@ class _Deadline:
         elif self._total_time <= 0:
             return self._total_time
 
-        return time.monotonic() - self._start
+        return max(self._deadline - time.monotonic(), 0)
 
     def __enter__(self):
         # Short circuit for blocking sockets or those without timeouts.
         if self._total_time is not None and self._total_time > 0:
-            self._start = time.monotonic()
+            self._deadline = time.monotonic() + self._total_time
 
         return self
 
@@ -76,28 +118,286 @@ class _Deadline:
         pass
 
 
+class IOStats:
+    """
+    Counters for the I/O a :class:`WrappedSocket` has done.
+
+    ``bytes_copied`` counts the bytes the socket wrapper itself has copied in
+    user space on their way between the network and SecureTransport. Copies
+    made by the kernel or inside SecureTransport are not included.
+    """
+    __slots__ = (
+        'send_calls', 'recv_calls', 'bytes_sent', 'bytes_received',
+        'bytes_copied',
+    )
+
+    def __init__(self):
+        self.send_calls = 0
+        self.recv_calls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_copied = 0
+
+    def __repr__(self):
+        fields = ', '.join(
+            '%s=%d' % (name, getattr(self, name)) for name in self.__slots__
+        )
+        return 'IOStats(%s)' % fields
+
+
+class MemoryBuffer:
+    """
+    An in-memory byte buffer for ciphertext, for use with
+    ``SecureTransportClientContext.wrap_buffers``. This plays the role of
+    ``ssl.MemoryBIO``.
+
+    SecureTransport reads ciphertext straight out of the ``incoming`` buffer
+    and writes it straight into the ``outgoing`` one, with no intermediate
+    copies. The caller writes data from the network into the former, and
+    sends data from the latter. For the latter, ``segments`` and ``consume``
+    allow the data to be sent without copying it out of the buffer.
+    """
+    def __init__(self, capacity: int = 65536):
+        self._ring = NativeRingBuffer(capacity)
+        self._eof = False
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of bytes currently in the buffer.
+        """
+        return len(self._ring)
+
+    @property
+    def eof(self) -> bool:
+        """
+        Whether the buffer is empty, and ``write_eof`` has been called.
+        """
+        return self._eof and not len(self._ring)
+
+    def write(self, buf: Any) -> int:
+        """
+        Appends the contents of ``buf``, which must support the buffer
+        protocol, to the buffer. Returns the number of bytes written.
+        """
+        if self._eof:
+            raise TLSError("cannot write() after write_eof()")
+
+        data = memoryview(buf).cast('B')
+        self._ring.append(data)
+        return len(data)
+
+    def write_eof(self) -> None:
+        """
+        Marks the end of the data, as when the network connection has been
+        closed. No more data may be written afterwards.
+        """
+        self._eof = True
+
+    def read(self, n: int = -1) -> bytes:
+        """
+        Reads and returns up to ``n`` bytes from the buffer. If ``n`` is
+        negative, reads everything.
+        """
+        length = len(self._ring)
+        if n >= 0:
+            length = min(n, length)
+
+        data = bytearray(length)
+        self._ring.readinto(data)
+        return bytes(data)
+
+    def readinto(self, buffer: Any) -> int:
+        """
+        Reads as many bytes as will fit into ``buffer``, which must support the
+        writable buffer protocol. Returns the number of bytes read.
+        """
+        return self._ring.readinto(buffer)
+
+    def segments(self):
+        """
+        Returns a tuple of at most two memoryviews that together cover the
+        contents of the buffer, without consuming them, suitable for
+        vectored I/O such as ``socket.sendmsg``.
+
+        Each view keeps the memory it covers allocated, so it is always safe
+        to read, even after the buffer has grown. Its contents are only
+        meaningful until those bytes are consumed, though: after that, later
+        writes may reuse the memory.
+        """
+        return self._ring.segments()
+
+    def consume(self, n: int) -> None:
+        """
+        Discards up to ``n`` bytes from the front of the buffer.
+        """
+        self._ring.consume(n)
+
+
+class RecordSizePolicy:
+    """
+    A policy for sizing the TLS records a connection writes, trading off
+    time-to-first-byte against throughput.
+
+    A TLS record can't be decrypted until all of it has arrived, so a large
+    record spread over several TCP segments delays the first byte the peer
+    can use. Connections using this policy start out writing small records
+    (``small_record_size`` bytes of plaintext, sized to fit in a single TCP
+    segment), then switch to maximum-size records once ``ramp_bytes`` have
+    been written, when throughput matters more than latency. A connection that
+    has not written anything for ``idle_timeout`` seconds goes back to small
+    records.
+    """
+    def __init__(self, small_record_size: int = 1400,
+                       large_record_size: int = _MAX_RECORD_PLAINTEXT,
+                       ramp_bytes: int = 1024 * 1024,
+                       idle_timeout: float = 1.0):
+        if not 0 < small_record_size <= large_record_size:
+            raise ValueError(
+                "small_record_size must be positive and no larger than "
+                "large_record_size"
+            )
+        if large_record_size > _MAX_RECORD_PLAINTEXT:
+            raise ValueError(
+                "large_record_size cannot exceed %d" % _MAX_RECORD_PLAINTEXT
+            )
+
+        self.small_record_size = small_record_size
+        self.large_record_size = large_record_size
+        self.ramp_bytes = ramp_bytes
+        self.idle_timeout = idle_timeout
+
+    def record_size(self, bytes_written: int) -> int:
+        """
+        Returns the plaintext size of the next record to write, given how many
+        bytes have been written since the connection was new or last idle.
+        """
+        if bytes_written < self.ramp_bytes:
+            return self.small_record_size
+        return self.large_record_size
+
+
 class SecureTransportClientContext(object):
     """
     A ClientContext for SecureTransport.
     """
-    def __init__(self, configuration: TLSConfiguration):
+    def __init__(self, configuration: TLSConfiguration,
+                       native_io: bool = True,
+                       record_size_policy: Optional[RecordSizePolicy] = None,
+                       send_high_water_mark: int = _SEND_HIGH_WATER_MARK,
+                       receive_high_water_mark: int = _RECEIVE_HIGH_WATER_MARK,
+                       receive_low_water_mark: Optional[int] = None,
+                       handshake_executor: Optional[
+                           concurrent.futures.Executor] = None):
         """
         Create a new client context from a given TLSConfiguration.
+
+        By default, connections shuttle ciphertext to and from SecureTransport
+        using I/O callbacks compiled in C. Set ``native_io`` to ``False`` to
+        use the Python callbacks instead.
+
+        If ``record_size_policy`` is given, connections split the data they
+        write into records as it dictates. Otherwise, record sizes are left to
+        SecureTransport, which makes each write as few records as it can.
+
+        ``send_high_water_mark`` bounds how much ciphertext a connection will
+        hold waiting to go out to the network. Writes take only as much
+        plaintext as fits below it, and raise WantWriteError once it has been
+        reached, so that large payloads are streamed rather than encrypted
+        all at once.
+
+        ``receive_high_water_mark`` and ``receive_low_water_mark`` bound how
+        much received ciphertext a connection will hold waiting to be
+        decrypted. Once the high-water mark is reached the connection asks to
+        stop reading from the network, and it asks to resume once it has
+        drained to the low-water mark, which defaults to a quarter of the
+        high-water mark. See ``_SecureTransportBuffer.reading_paused``.
+
+        If ``handshake_executor`` is given, ``do_handshake_async`` runs
+        handshake steps on it rather than in the calling thread. Each step
+        can include evaluating the peer's certificate chain, which may take
+        tens of milliseconds: something like a ``ThreadPoolExecutor`` with a
+        few workers keeps that off an event loop, while bounding how many
+        handshakes run at once.
         """
+        if send_high_water_mark <= 0:
+            raise ValueError("send_high_water_mark must be positive")
+        if receive_low_water_mark is None:
+            receive_low_water_mark = receive_high_water_mark // 4
+        if not 0 <= receive_low_water_mark <= receive_high_water_mark:
+            raise ValueError(
+                "receive_low_water_mark must be between 0 and "
+                "receive_high_water_mark"
+            )
+
         self.__configuration = configuration
+        self.__native_io = native_io
+        self.__record_size_policy = record_size_policy
+        self.__send_high_water_mark = send_high_water_mark
+        self.__receive_high_water_mark = receive_high_water_mark
+        self.__receive_low_water_mark = receive_low_water_mark
+        self.__handshake_executor = handshake_executor
 
     @property
     def configuration(self) -> TLSConfiguration:
         return self.__configuration
 
+    @property
+    def native_io(self) -> bool:
+        return self.__native_io
+
+    @property
+    def record_size_policy(self) -> Optional[RecordSizePolicy]:
+        return self.__record_size_policy
+
+    @property
+    def send_high_water_mark(self) -> int:
+        return self.__send_high_water_mark
+
+    @property
+    def receive_high_water_mark(self) -> int:
+        return self.__receive_high_water_mark
+
+    @property
+    def receive_low_water_mark(self) -> int:
+        return self.__receive_low_water_mark
+
+    @property
+    def handshake_executor(self) -> Optional[concurrent.futures.Executor]:
+        return self.__handshake_executor
+
     def wrap_socket(self, socket: socket.socket,
                           server_hostname: Optional[str],
                           auto_handshake: bool = True) -> TLSWrappedSocket:
         buffer = _SecureTransportBuffer(server_hostname, self)
         return WrappedSocket(socket, buffer)
 
-    def wrap_buffers(self, server_hostname: Optional[str]) -> TLSWrappedBuffer:
-        return _SecureTransportBuffer(server_hostname, self)
+    def wrap_buffers(self, incoming: Optional[MemoryBuffer],
+                           outgoing: Optional[MemoryBuffer],
+                           server_hostname: Optional[str]) -> TLSWrappedBuffer:
+        """
+        Wraps a pair of MemoryBuffers: SecureTransport reads ciphertext from
+        ``incoming`` and writes ciphertext to ``outgoing``.
+
+        Either may be ``None``, in which case the returned object keeps an
+        internal buffer instead, to be fed with ``receive_bytes_from_network``
+        or drained with ``peek_bytes`` and ``consume_bytes``.
+
+        Unlike ``ClientContext.wrap_buffers``, this doesn't accept arbitrary
+        file objects or buffer-protocol objects: SecureTransport reads and
+        writes the buffers directly from C, which needs the ring buffers
+        inside MemoryBuffer. Anything else raises TypeError.
+        """
+        for name, buffer in (('incoming', incoming), ('outgoing', outgoing)):
+            if buffer is not None and not isinstance(buffer, MemoryBuffer):
+                raise TypeError(
+                    "%s must be a MemoryBuffer, not %r" %
+                    (name, type(buffer).__name__)
+                )
+
+        return _SecureTransportBuffer(
+            server_hostname, self, incoming=incoming, outgoing=outgoing
+        )
 
 
 class WrappedSocket(TLSWrappedSocket):
@@ -110,9 +410,9 @@ class WrappedSocket(TLSWrappedSocket):
         self.__dict__['_buffer'] = buffer
         self.__dict__['_timeout'] = socket.gettimeout()
 
-        # We are setting the socket timeout to zero here, regardless of what it
-        # was before, because we want to operate the socket in non-blocking
-        # mode. This requires some context.
+        # If the socket has a timeout, we set it to zero here because we want
+        # to operate the socket in non-blocking mode. This requires some
+        # context.
         #
         # Python sockets have three modes: blocking, non-blocking, and timeout.
         # However, "real" sockets only have two: blocking and non-blocking.
@@ -127,77 +427,202 @@ class WrappedSocket(TLSWrappedSocket):
         # class, and one used in the socket. That's gloriously silly. So
         # instead we take responsibility for managing the socket timeout
         # ourselves.
-        socket.settimeout(0)
+        #
+        # Fully blocking sockets (timeout of None) are the exception: there's
+        # no timeout to enforce, so we leave the socket blocking and let the
+        # kernel do the waiting. That saves a select call for every read and
+        # write.
+        self._apply_timeout()
+
+        # The selector is created on first use and then kept for the lifetime
+        # of the socket, rather than creating (and on Linux, making an
+        # epoll_create syscall for) a new one on every call.
+        self.__dict__['_selector'] = None
+        self.__dict__['_selector_events'] = 0
+
+        # A reusable buffer for reads from the network. See _do_read.
+        self.__dict__['_receive_view'] = memoryview(
+            bytearray(_MAX_RECORD_SIZE)
+        )
+        self.__dict__['_full_reads'] = 0
+        self.__dict__['_small_reads'] = 0
+
+        self.__dict__['_stats'] = IOStats()
 
-    def _do_read(self, selector, deadline):
+        # Like socket.socket, we only really close once every file object
+        # returned by makefile has been closed too. See close.
+        self.__dict__['_io_refs'] = 0
+        self.__dict__['_closed'] = False
+
+    def _apply_timeout(self):
         """
-        A helper method that performs a read from the network and passes the
-        data into the receive buffer.
+        Puts the underlying socket in the right mode for our timeout: blocking
+        if we have no timeout, non-blocking otherwise.
+        """
+        if self._timeout is None:
+            self._socket.settimeout(None)
+        else:
+            self._socket.settimeout(0)
+
+    def _wait(self, events, deadline):
         """
-        selector.modify(self._socket, selectors.EVENT_READ)
+        A helper method that waits until the socket is ready for ``events``,
+        for no longer than the deadline allows.
+        """
+        # Blocking sockets wait in the syscall itself, and non-blocking ones
+        # don't wait at all: they just try the syscall, and turn EAGAIN into
+        # WantReadError or WantWriteError.
+        if not self._timeout:
+            return
+
+        selector = self._selector
+        if selector is None:
+            selector = selectors.DefaultSelector()
+            selector.register(self._socket, events)
+            self.__dict__['_selector'] = selector
+            self.__dict__['_selector_events'] = events
+        elif self._selector_events != events:
+            selector.modify(self._socket, events)
+            self.__dict__['_selector_events'] = events
+
         results = selector.select(deadline.remaining_time())
 
         if not results:
-            # TODO: Is there a better way we can throw this?
-            raise BlockingIOError()
+            if events == selectors.EVENT_READ:
+                raise socket.timeout("The read operation timed out")
+            raise socket.timeout("The write operation timed out")
+
+    def _close_selector(self):
+        if self._selector is not None:
+            if self._selector_events:
+                self._selector.unregister(self._socket)
+            self._selector.close()
+            self.__dict__['_selector'] = None
+            self.__dict__['_selector_events'] = 0
+
+    def _do_read(self, deadline):
+        """
+        A helper method that performs a read from the network and passes the
+        data into the receive buffer.
+        """
+        # We only get here when SecureTransport can't make progress without
+        # more data, so we always read at least a whole record, even if the
+        # buffer is past its high-water mark. Otherwise we don't pull more
+        # than the buffer has room for.
+        view = self._receive_view
+        nbytes = min(
+            len(view), max(self._buffer.receive_window(), _MAX_RECORD_SIZE)
+        )
 
-        assert len(results) == 1
-        assert results[0][1] == selectors.EVENT_READ
+        while True:
+            self._wait(selectors.EVENT_READ, deadline)
+            try:
+                received = self._socket.recv_into(view, nbytes)
+            except BlockingIOError:
+                if self._timeout == 0:
+                    raise WantReadError("Must read data") from None
+                # Otherwise the selector woke us spuriously, so wait again.
+            else:
+                break
 
-        # TODO: This can still technically EAGAIN. We need to resolve that.
-        data = self._socket.recv(8192)
-        if not data:
+        stats = self._stats
+        stats.recv_calls += 1
+        if not received:
             return 0
-        self._buffer.receive_bytes_from_network(data)
-        return len(data)
+        self._buffer.receive_bytes_from_network(view[:received])
+        stats.bytes_received += received
+        stats.bytes_copied += received
+
+        self._resize_receive_view(received)
+        return received
 
-    def _do_write(self, selector, deadline):
+    def _resize_receive_view(self, received):
+        """
+        Adapts the size of the network read buffer to the read that just
+        returned ``received`` bytes.
+
+        If reads keep filling the whole buffer, the peer is sending faster
+        than we're reading, so we read more at a time, up to
+        _MAX_RECEIVE_SIZE. A single full read proves little: a peer sending
+        exactly one big response fills it once. Once reads stay small, we
+        shrink back towards a single record, so that a connection that was
+        busy once doesn't hold on to a large buffer for the rest of its life.
+        """
+        size = len(self._receive_view)
+        if received == size:
+            self.__dict__['_small_reads'] = 0
+            self.__dict__['_full_reads'] += 1
+            if (self._full_reads >= _RECEIVE_GROW_AFTER and
+                    size < _MAX_RECEIVE_SIZE):
+                self._replace_receive_view(min(size * 2, _MAX_RECEIVE_SIZE))
+        elif received <= size // 4 and size > _MAX_RECORD_SIZE:
+            self.__dict__['_full_reads'] = 0
+            self.__dict__['_small_reads'] += 1
+            if self._small_reads >= _RECEIVE_SHRINK_AFTER:
+                self._replace_receive_view(max(size // 2, _MAX_RECORD_SIZE))
+        else:
+            self.__dict__['_full_reads'] = 0
+            self.__dict__['_small_reads'] = 0
+
+    def _replace_receive_view(self, size):
+        self.__dict__['_receive_view'] = memoryview(bytearray(size))
+        self.__dict__['_full_reads'] = 0
+        self.__dict__['_small_reads'] = 0
+
+    def _do_write(self, deadline):
         """
         A helper method that attempts to write all of the data from the send
         buffer to the network. This may make multiple I/O calls, but will not
         spend longer than the deadline allows.
         """
-        selector.modify(self._socket, selectors.EVENT_WRITE)
-
+        stats = self._stats
         total_sent = 0
         while True:
-            data = self._buffer.peek_bytes(8192)
-            if not data:
+            # The send buffer is a ring, so its contents are at most two
+            # segments. sendmsg flushes both in a single syscall, straight
+            # from the buffer's memory. Partial sends just advance the start
+            # of the ring.
+            segments = self._buffer.peek_segments()
+            if not segments:
                 break
 
-            results = selector.select(deadline.remaining_time())
+            self._wait(selectors.EVENT_WRITE, deadline)
 
-            if not results:
-                # TODO: Is there a better way we can throw this?
-                raise BlockingIOError()
-
-            assert len(results) == 1
-            assert results[0][1] == selectors.EVENT_WRITE
-
-            # TODO: This can still technically EAGAIN. We need to resolve that.
-            sent = self._socket.send(data)
+            try:
+                if len(segments) == 1:
+                    sent = self._socket.send(segments[0])
+                else:
+                    sent = self._socket.sendmsg(segments)
+            except BlockingIOError:
+                if self._timeout == 0:
+                    raise WantWriteError("Must write data") from None
+                continue
             self._buffer.consume_bytes(sent)
+            stats.send_calls += 1
+            stats.bytes_sent += sent
             total_sent += sent
 
         return total_sent
 
     def do_handshake(self) -> None:
-        with selectors.DefaultSelector() as sel, _Deadline(self._timeout) as deadline:
-            sel.register(self._socket, selectors.EVENT_READ)
+        with _Deadline(self._timeout) as deadline:
             while True:
                 try:
                     self._buffer.do_handshake()
                 except WantReadError:
-                    bytes_read = self._do_read(sel, deadline)
+                    bytes_read = self._do_read(deadline)
 
                     if not bytes_read:
                         raise TLSError("Unexpected EOF during handshake")
                 except WantWriteError:
-                    self._do_write(sel, deadline)
+                    self._do_write(deadline)
                 else:
                     # Handshake complete!
                     break
 
+    def session_state(self) -> SSLSessionState:
+        return self._buffer.session_state()
+
     def cipher(self) -> Optional[CipherSuite]:
         return self._buffer.cipher()
 
@@ -220,11 +645,10 @@ class WrappedSocket(TLSWrappedSocket):
 
         # TODO: So, does unwrap make any sense here? How do we make sure we
         # read up to close_notify, but no further?
-        with selectors.DefaultSelector() as sel, _Deadline(self._timeout) as deadline:
-            sel.register(self._socket, selectors.EVENT_WRITE)
+        with _Deadline(self._timeout) as deadline:
             while True:
                 try:
-                    written = self._do_write(sel, deadline)
+                    written = self._do_write(deadline)
                 except ConnectionError:
                     # The socket is not able to tolerate sending, so we're done
                     # here.
@@ -233,13 +657,25 @@ class WrappedSocket(TLSWrappedSocket):
                     if not written:
                         break
 
+        # The caller gets the socket back as it was given to us, without our
+        # selector watching it.
+        self._close_selector()
         return self._socket
 
     def close(self):
+        self.__dict__['_closed'] = True
+        if self._io_refs > 0 or self._socket is None:
+            return
+
         # TODO: we need to do better here with CLOSE_NOTIFY. In particular, we
         # need a way to do a graceful connection shutdown that produces data
         # until the remote party has done CLOSE_NOTIFY.
-        self.unwrap()
+        try:
+            self.unwrap()
+        except WantWriteError:
+            # Sending close_notify is best effort for non-blocking sockets.
+            pass
+        self._close_selector()
         self._socket.close()
 
         # We lose our reference to our socket here so that we can do some
@@ -249,8 +685,7 @@ class WrappedSocket(TLSWrappedSocket):
     def recv(self, bufsize, flags=0):
         # This method loops in order for blocking sockets to behave correctly
         # when drip-fed data.
-        with selectors.DefaultSelector() as sel, _Deadline(self._timeout) as deadline:
-            sel.register(self._socket, selectors.EVENT_READ)
+        with _Deadline(self._timeout) as deadline:
             while True:
                 # This check is inside the loop because of the possibility that
                 # side-effects triggered elsewhere in the loop body could cause
@@ -258,71 +693,354 @@ class WrappedSocket(TLSWrappedSocket):
                 if self._socket is None:
                     return b''
 
-                # TODO: This must also tolerate WantWriteError. Probably that
-                # will allow us to unify our code with do_handhake and send.
+                # If SecureTransport already has decrypted data buffered,
+                # return just that: asking for more would only send
+                # SecureTransport back to the (empty) receive buffer for it.
+                buffered = self._buffer.pending()
+                if buffered:
+                    bufsize = min(bufsize, buffered)
+
                 try:
                     return self._buffer.read(bufsize)
+                except SecureTransportError as exc:
+                    # Like the standard library, treat close_notify as EOF.
+                    if exc.error_code != SSLErrors.errSSLClosedGraceful:
+                        raise
+                    return b''
                 except WantReadError:
-                    self._do_read(sel, deadline)
+                    if not self._do_read(deadline):
+                        return b''
+                except WantWriteError:
+                    # A non-blocking send left ciphertext behind. Send it if
+                    # we can, but SecureTransport still needs data to read,
+                    # and the peer may not read ours until we read theirs, so
+                    # fall back to reading if the network won't take it.
+                    try:
+                        self._do_write(deadline)
+                    except WantWriteError:
+                        if not self._do_read(deadline):
+                            return b''
 
     def recv_into(self, buffer, nbytes=None, flags=0):
-        read_size = nbytes or len(buffer)
-        data = self.read(read_size, flags)
-        buffer[:len(data)] = data
-        return len(data)
+        # This is the same loop as recv, but SecureTransport decrypts straight
+        # into the caller's buffer rather than handing us a new bytestring.
+        with _Deadline(self._timeout) as deadline:
+            while True:
+                if self._socket is None:
+                    return 0
+
+                amt = nbytes or None
+                buffered = self._buffer.pending()
+                if buffered:
+                    amt = min(amt or buffered, buffered)
+
+                try:
+                    return self._buffer.readinto(buffer, amt)
+                except SecureTransportError as exc:
+                    # See recv.
+                    if exc.error_code != SSLErrors.errSSLClosedGraceful:
+                        raise
+                    return 0
+                except WantReadError:
+                    if not self._do_read(deadline):
+                        return 0
+                except WantWriteError:
+                    # See recv.
+                    try:
+                        self._do_write(deadline)
+                    except WantWriteError:
+                        if not self._do_read(deadline):
+                            return 0
 
     def send(self, data, flags=0):
+        with _Deadline(self._timeout) as deadline:
+            return self._send(data, deadline)
+
+    def _send(self, data, deadline):
+        """
+        Sends as much of ``data`` as fits in the send buffer, and returns how
+        much that was, spending no longer than the deadline allows.
+        """
         # TODO: This must also tolerate WantReadError. Probably that will allow
         # us to unify our code with do_handhake and recv.
+        while True:
+            try:
+                written = self._buffer.write(data)
+            except WantWriteError:
+                # The buffer is holding as much ciphertext as it's allowed
+                # to. Unlike OpenSSL, we don't need to retry with the same
+                # buffer: nothing was consumed, so once we've drained the
+                # buffer we can simply try again. If the socket is
+                # non-blocking and can't take it, the WantWriteError
+                # propagates, and still nothing has been consumed.
+                self._do_write(deadline)
+            else:
+                break
+
         try:
-            self._buffer.write(data)
+            self._do_write(deadline)
         except WantWriteError:
-            # TODO: Ok, so this is a fun problem. Let's talk about it.
-            #
-            # If we make the rule that the socket will always drain the send
-            # buffer when sending data (a good plan, and one that matches the
-            # behaviour of the legacy ``ssl`` module), then the only way
-            # WantWriteError can occur is if the amount of data to be written
-            # is larger than the write buffer in the buffer object.
-            # Now OpenSSL tolerates this by basically saying that if this
-            # happens, you need to drain the write buffer, and then to call
-            # "SSL_write" again with the exact same buffer, and it'll just
-            # continue from where it was.
-            #
-            # This is a pretty stupid behaviour, but it's do-able. The bigger
-            # problem is that, while we could in principle change it (e.g. by
-            # having WantWriteError indicate how many bytes were consumed),
-            # making that change will require that OpenSSL implementations
-            # bend over backwards to work around their requirement to reuse the
-            # same buffer.
-            #
-            # All of this is wholly gross, and I haven't really decided how I
-            # want to proceed with it, but we do need to decide how we want to
-            # handle it before we can move forward.
-
-            # TODO: Another relevant reference for us is this comment from the
-            # curl codebase: https://github.com/curl/curl/blob/807698db025f489dd7894f1195e4983be632bee2/lib/vtls/darwinssl.c#L2477-L2489
+            # We've taken the caller's data, so we must report it. The
+            # ciphertext stays buffered, and goes out on the next send or
+            # flush.
             pass
 
-        with selectors.DefaultSelector() as sel, _Deadline(self._timeout) as deadline:
-            sel.register(self._socket, selectors.EVENT_WRITE)
-            sent = self._do_write(sel, deadline)
-        return sent
+        # Like socket.send, we report how much of the caller's data we took,
+        # not how much ciphertext went out. That may be less than all of it
+        # if the data didn't fit below the send buffer's high-water mark.
+        return written
+
+    def flush(self) -> None:
+        """
+        Sends any ciphertext waiting in the send buffer. On a non-blocking
+        socket, raises WantWriteError if the network can't take it all yet,
+        in which case call this again once the socket is writable.
+        """
+        with _Deadline(self._timeout) as deadline:
+            self._do_write(deadline)
+
+    def pending(self) -> int:
+        """
+        Returns the number of bytes of already-decrypted data that can be read
+        without any further data from the network. Like ``ssl.SSLSocket``,
+        event loops should drain this before waiting for the socket to become
+        readable.
+        """
+        if self._socket is None:
+            return 0
+        return self._buffer.pending()
+
+    def pending_ciphertext(self) -> int:
+        """
+        Returns the number of bytes that have been read from the socket, but
+        not yet decrypted.
+        """
+        if self._socket is None:
+            return 0
+        return self._buffer.pending_ciphertext()
 
     def sendall(self, bytes, flags=0):
-        # TODO: Does this obey timeout in the stdlib?
-        send_buffer = memoryview(bytes)
-        while send_buffer:
-            sent = self.send(send_buffer, flags)
-            send_buffer = send_buffer[sent:]
+        # As in the standard library, the timeout applies to the whole call,
+        # not to each send.
+        #
+        # Each send takes at most a high-water mark's worth of the data and
+        # flushes it, so this streams payloads of any size through a buffer
+        # of constant size. Slicing a memoryview doesn't copy. Casting it to
+        # bytes makes sure that lengths and offsets are in bytes even for
+        # objects like array.array whose items are wider than a byte.
+        send_buffer = memoryview(bytes).cast('B')
+        with _Deadline(self._timeout) as deadline:
+            while send_buffer:
+                sent = self._send(send_buffer, deadline)
+                send_buffer = send_buffer[sent:]
 
         return
 
+    def sendfile(self, file, offset=0, count=None):
+        """
+        Sends the contents of ``file``, which must be a regular file opened in
+        binary mode, until EOF is reached or ``count`` bytes have been sent,
+        starting at ``offset``. Returns the number of bytes sent, and leaves
+        the file positioned after the last byte sent, like
+        ``socket.sendfile``.
+
+        The kernel can't encrypt for us, so this can't use os.sendfile.
+        Instead the file is memory-mapped a window at a time and
+        SecureTransport encrypts straight from the mapping, so the data is
+        never copied into Python bytes objects, and the ciphertext is bounded
+        by the send buffer's high-water mark however large the file is. Files
+        that can't be mapped are read a chunk at a time into a single reused
+        buffer instead.
+        """
+        if self._timeout == 0:
+            raise ValueError("the socket must be blocking")
+        if 'b' not in getattr(file, 'mode', 'b'):
+            raise ValueError("file should be opened in binary mode")
+        if not isinstance(offset, int):
+            raise TypeError(
+                "offset must be an integer, not %r" % type(offset).__name__
+            )
+        if offset < 0:
+            raise ValueError("offset must be non-negative, not %d" % offset)
+        if count is not None:
+            if not isinstance(count, int):
+                raise TypeError(
+                    "count must be a positive integer, not %r" %
+                    type(count).__name__
+                )
+            if count <= 0:
+                raise ValueError("count must be a positive integer, not %d" %
+                                 count)
+
+        try:
+            fileno = file.fileno()
+            fsize = os.fstat(fileno).st_size
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            return self._sendfile_use_readinto(file, offset, count)
+
+        # Empty "files" are frequently things like pipes that can't be mapped,
+        # but which may yet have data to read.
+        if not fsize:
+            return self._sendfile_use_readinto(file, offset, count)
+
+        end = fsize if count is None else min(offset + count, fsize)
+        position = offset
+        try:
+            while position < end:
+                # mmap offsets must be multiples of the allocation
+                # granularity.
+                start = position - (position % mmap.ALLOCATIONGRANULARITY)
+                length = min(_SENDFILE_WINDOW, end - start)
+                mapped = mmap.mmap(
+                    fileno, length, access=mmap.ACCESS_READ, offset=start
+                )
+                try:
+                    view = memoryview(mapped)[position - start:]
+                    while view:
+                        sent = self.send(view)
+                        position += sent
+                        view = view[sent:]
+                    view.release()
+                finally:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        # Views into the map are still alive, probably in the
+                        # traceback of an error. Let the map be closed when
+                        # they're collected.
+                        pass
+        finally:
+            if position > offset and hasattr(file, 'seek'):
+                file.seek(position)
+
+        return position - offset
+
+    def _sendfile_use_readinto(self, file, offset, count):
+        """
+        The fallback for sendfile: reads the file into a reused buffer and
+        sends it from there.
+        """
+        if offset:
+            file.seek(offset)
+
+        chunk = memoryview(bytearray(self._buffer.send_high_water_mark))
+        total_sent = 0
+        try:
+            while count is None or total_sent < count:
+                wanted = len(chunk)
+                if count is not None:
+                    wanted = min(wanted, count - total_sent)
+
+                read = file.readinto(chunk[:wanted])
+                if not read:
+                    break
+
+                view = chunk[:read]
+                while view:
+                    sent = self.send(view)
+                    total_sent += sent
+                    view = view[sent:]
+        finally:
+            if total_sent > 0 and hasattr(file, 'seek'):
+                file.seek(offset + total_sent)
+
+        return total_sent
+
+    def cork(self) -> None:
+        """
+        Starts coalescing sent data into as few maximum-size TLS records as
+        possible. See ``_SecureTransportBuffer.cork``.
+        """
+        self._buffer.cork()
+
+    def uncork(self) -> None:
+        """
+        Stops coalescing sent data, and sends anything that was held back.
+        """
+        self._buffer.uncork()
+        with _Deadline(self._timeout) as deadline:
+            self._do_write(deadline)
+
+    @contextmanager
+    def corked(self):
+        """
+        A context manager that corks the socket for the duration of the
+        ``with`` block, and sends everything written in it on exit.
+        """
+        self.cork()
+        try:
+            yield self
+        finally:
+            self.uncork()
+
     def makefile(self, mode='r', buffering=None, *, encoding=None, errors=None, newline=None):
-        pass
+        """
+        Returns a file object for the decrypted stream, with the same
+        semantics as ``socket.makefile``.
+
+        Reads decrypt straight into the file object's buffer, so ``readline``
+        and ``read`` don't cost a bytestring allocation per network read.
+        """
+        if not set(mode) <= {"r", "w", "b"}:
+            raise ValueError(
+                "invalid mode %r (only r, w, b allowed)" % (mode,)
+            )
+        writing = "w" in mode
+        reading = "r" in mode or not writing
+        binary = "b" in mode
+        rawmode = ""
+        if reading:
+            rawmode += "r"
+        if writing:
+            rawmode += "w"
+
+        raw = _WrappedSocketIO(self, rawmode)
+        self.__dict__['_io_refs'] += 1
+
+        if buffering is None:
+            buffering = -1
+        if buffering < 0:
+            # A buffer that holds a whole record lets each read from the
+            # file object decrypt a full record in one go.
+            buffering = max(io.DEFAULT_BUFFER_SIZE, _MAX_RECORD_PLAINTEXT)
+        if buffering == 0:
+            if not binary:
+                raise ValueError("unbuffered streams must be binary")
+            return raw
+
+        if reading and writing:
+            buffer = io.BufferedRWPair(raw, raw, buffering)
+        elif reading:
+            buffer = io.BufferedReader(raw, buffering)
+        else:
+            buffer = io.BufferedWriter(raw, buffering)
+        if binary:
+            return buffer
+
+        text = io.TextIOWrapper(buffer, encoding, errors, newline)
+        text.mode = mode
+        return text
+
+    def _decref_socketios(self):
+        """
+        Called by file objects from makefile when they are closed.
+        """
+        if self._io_refs > 0:
+            self.__dict__['_io_refs'] -= 1
+        if self._closed:
+            self.close()
+
+    @property
+    def io_stats(self) -> IOStats:
+        """
+        Counters for the network I/O done by this socket.
+        """
+        return self._stats
 
     def settimeout(self, timeout):
         self.__dict__['_timeout'] = timeout
+        if self._socket is not None:
+            self._apply_timeout()
 
     def gettimeout(self):
         return self._timeout
@@ -334,19 +1052,138 @@ class WrappedSocket(TLSWrappedSocket):
         return setattr(self._socket, attribute, value)
 
 
+class _WrappedSocketIO(io.RawIOBase):
+    """
+    A raw I/O object over a WrappedSocket, used by ``WrappedSocket.makefile``.
+
+    This is modelled on ``socket.SocketIO``, but reads go through
+    ``WrappedSocket.recv_into`` so that SecureTransport decrypts directly into
+    the buffer we're given.
+    """
+    def __init__(self, sock, mode):
+        if mode not in ("r", "w", "rw"):
+            raise ValueError("invalid mode: %r" % mode)
+        io.RawIOBase.__init__(self)
+        self._sock = sock
+        self._mode = mode + "b"
+        self._reading = "r" in mode
+        self._writing = "w" in mode
+        self._timeout_occurred = False
+
+    def readinto(self, b):
+        self._checkClosed()
+        self._checkReadable()
+        if self._timeout_occurred:
+            raise OSError("cannot read from timed out object")
+
+        try:
+            return self._sock.recv_into(b)
+        except WantReadError:
+            # Like socket.SocketIO, a non-blocking socket with nothing to read
+            # returns None.
+            return None
+        except socket.timeout:
+            # As with socket.SocketIO, a timeout may have left a record
+            # partially read, so the stream can't be trusted afterwards.
+            self._timeout_occurred = True
+            raise
+
+    def write(self, b):
+        self._checkClosed()
+        self._checkWritable()
+        try:
+            return self._sock.send(b)
+        except WantWriteError:
+            return None
+
+    def readable(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed socket.")
+        return self._reading
+
+    def writable(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed socket.")
+        return self._writing
+
+    def seekable(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed socket.")
+        return super().seekable()
+
+    def fileno(self):
+        self._checkClosed()
+        return self._sock.fileno()
+
+    @property
+    def name(self):
+        if not self.closed:
+            return self.fileno()
+        return -1
+
+    @property
+    def mode(self):
+        return self._mode
+
+    def close(self):
+        if self.closed:
+            return
+        io.RawIOBase.close(self)
+        self._sock._decref_socketios()
+        self._sock = None
+
+
 class _SecureTransportBuffer(TLSWrappedBuffer):
-    def __init__(self, server_hostname, context):
+    def __init__(self, server_hostname, context, incoming=None,
+                 outgoing=None):
         self._original_context = context
 
         self._st_context = SSLSessionContext(
             SSLProtocolSide.Client, SSLConnectionType.StreamType
         )
-        self._st_context.set_io_funcs(self._read_func, self._write_func)
+
+        # Ciphertext is held in native rings whichever set of callbacks is
+        # in use: the Python callbacks copy in and out of them too.
+        self._incoming = incoming
+        if incoming is not None:
+            self._receive_buffer = incoming._ring
+        else:
+            self._receive_buffer = NativeRingBuffer()
+        if outgoing is not None:
+            self._send_buffer = outgoing._ring
+        else:
+            self._send_buffer = NativeRingBuffer()
+
+        if context.native_io:
+            self._st_context.set_native_io(
+                self._receive_buffer, self._send_buffer
+            )
+        else:
+            self._st_context.set_io_funcs(
+                self._read_func, self._write_func, in_place=True
+            )
+
         if server_hostname is not None:
             self._st_context.set_peer_domain_name(server_hostname)
 
-        self._receive_buffer = bytearray()
-        self._send_buffer = bytearray()
+        # Plaintext held back while corked. See cork().
+        self._corked = False
+        self._cork_buffer = bytearray()
+
+        # The most ciphertext we'll hold for the network. See write().
+        self._send_high_water_mark = context.send_high_water_mark
+
+        # Flow control for ciphertext from the network. See reading_paused.
+        self._receive_high_water_mark = context.receive_high_water_mark
+        self._receive_low_water_mark = context.receive_low_water_mark
+        self._reading_paused = False
+        self._pause_reading = None
+        self._resume_reading = None
+
+        # State for the record size policy, if any. See _record_size().
+        self._record_size_policy = context.record_size_policy
+        self._bytes_since_idle = 0
+        self._last_write_time = 0.0
 
         # Also apply any configuration we may have to apply.
         self._process_configuration()
@@ -426,8 +1263,23 @@ class _SecureTransportBuffer(TLSWrappedBuffer):
         if self._send_buffer:
             return WantWriteError("Must write data")
 
+        # If the caller has told us no more data is coming, waiting to read is
+        # pointless.
+        if self._incoming is not None and self._incoming.eof:
+            return TLSError("EOF occurred in violation of protocol")
+
         return WantReadError("Must read data")
 
+    def _raise_for_status(self, status):
+        """
+        Raises the appropriate exception for a non-zero OSStatus, turning
+        errSSLWouldBlock into the right I/O error directly.
+        """
+        if status == _WOULD_BLOCK:
+            raise self._io_error()
+
+        _raise_on_error(status)
+
     def _validate_with_custom_trust(self):
         """
         Validate the peer cert chain with a custom trust store.
@@ -449,62 +1301,291 @@ class _SecureTransportBuffer(TLSWrappedBuffer):
         if not result:
             raise TLSError("Failed to validate certificates!")
 
-    def _read_func(self, _, to_read):
-        # We're doing some unnecessary copying here, but that's ok for
-        # demo purposes.
+    def _read_func(self, _, buffer):
         rc = 0
-        output_data = self._receive_buffer[:to_read]
-        del self._receive_buffer[:to_read]
+        read = self._receive_buffer.readinto(buffer)
 
-        if len(output_data) < to_read:
+        if read < len(buffer):
             rc = SSLErrors.errSSLWouldBlock
 
-        return rc, output_data
+        return rc, read
 
     def _write_func(self, _, data):
-        self._send_buffer += data
+        self._send_buffer.append(data)
         return 0, len(data)
 
     def read(self, amt: Optional[int] = None) -> bytes:
         assert amt is not None
-        try:
-           return self._st_context.read(amt)
-        except WouldBlockError:
-            raise self._io_error() from None
+        # We use the status-returning API here and below so that would-block
+        # conditions only cost us the one exception we actually raise.
+        status, data = self._st_context.read_status(amt)
+        if self._reading_paused:
+            self._maybe_resume_reading()
+        if status:
+            self._raise_for_status(status)
+        return data
 
     def readinto(self, buffer: Any, amt: Optional[int] = None) -> int:
-        if amt is None or amt > len(buffer):
-            amt = len(buffer)
-
-        data = self.read(amt)
-        buffer[:len(data)] = data
-        return len(data)
+        status, read = self._st_context.readinto_status(buffer, amt)
+        if self._reading_paused:
+            self._maybe_resume_reading()
+        if status:
+            self._raise_for_status(status)
+        return read
 
     def write(self, buf: Any) -> int:
+        """
+        Encrypts as much of ``buf`` as fits below the send buffer's high-water
+        mark, and returns the number of bytes of it that were consumed. While
+        a record size policy has the connection writing small records, each
+        write takes less than that: see ``_write_limit``.
+
+        Raises WantWriteError without consuming anything if the send buffer
+        is already at its high-water mark.
+        """
+        room = self._send_high_water_mark - len(self._send_buffer)
+        if room <= 0:
+            raise WantWriteError("Must write data")
+
+        if self._corked:
+            return self._write_corked(buf, room)
+
+        limit = self._write_limit()
+        if limit is not None:
+            room = min(room, limit)
+
+        data = memoryview(buf).cast('B')
+        if len(data) > room:
+            buf = data[:room]
+        return self._write_records(buf)
+
+    def _record_size(self):
+        """
+        Returns the amount of plaintext that should go in the next record.
+        """
+        policy = self._record_size_policy
+        if policy is None:
+            return _MAX_RECORD_PLAINTEXT
+
+        if time.monotonic() - self._last_write_time > policy.idle_timeout:
+            self._bytes_since_idle = 0
+
+        return policy.record_size(self._bytes_since_idle)
+
+    def _write_limit(self):
+        """
+        Returns the most plaintext one write should encrypt, or ``None`` for
+        no limit beyond the high-water mark.
+
+        Small records only help time-to-first-byte if the first of them goes
+        out before the rest are encrypted, so while the policy calls for
+        small records, a write takes no more than has been written since the
+        connection went idle, and at least one record. The caller sends each
+        batch before writing the next, and batches double in size, much as
+        TCP's congestion window grows.
+        """
+        policy = self._record_size_policy
+        if policy is None:
+            return None
+
+        size = self._record_size()
+        if size >= policy.large_record_size:
+            return None
+        return max(size, self._bytes_since_idle)
+
+    def _write_records(self, buf):
+        """
+        Hands ``buf`` to SecureTransport, split into records as the record
+        size policy dictates. Returns the number of bytes written.
+        """
+        if self._record_size_policy is None:
+            status, written = self._st_context.write_status(buf)
+            if status:
+                self._raise_for_status(status)
+            return written
+
+        # Each SSLWrite call of no more than a record's worth of plaintext
+        # produces exactly one record.
+        data = memoryview(buf).cast('B')
+        total = 0
+        while data:
+            status, written = self._st_context.write_status(
+                data[:self._record_size()]
+            )
+            self._bytes_since_idle += written
+            self._last_write_time = time.monotonic()
+            total += written
+
+            if status:
+                # Report what we did write. If the problem persists, the
+                # caller will hit it again on their next write.
+                if total:
+                    break
+                self._raise_for_status(status)
+
+            data = data[written:]
+
+        return total
+
+    def _write_all(self, buf):
+        """
+        Writes all of ``buf``, making as many calls to SecureTransport as it
+        takes.
+        """
+        data = memoryview(buf).cast('B')
+        while data:
+            data = data[self._write_records(data):]
+
+    def _write_corked(self, buf, room):
+        """
+        Accumulates plaintext while the buffer is corked, only handing it to
+        SecureTransport once there is a full record's worth. Returns the number
+        of bytes consumed, which is short if the full records in ``buf``
+        wouldn't fit in ``room``.
+        """
+        data = memoryview(buf).cast('B')
+        pending = self._cork_buffer
+        record_size = self._record_size()
+        consumed = 0
+
+        # First, top up any partial record we already have.
+        if pending:
+            needed = max(record_size - len(pending), 0)
+            pending += data[:needed]
+            consumed = min(needed, len(data))
+            data = data[needed:]
+            if len(pending) < record_size:
+                return consumed
+
+            self._write_all(pending)
+            pending.clear()
+            room -= record_size
+
+        # Then write as many full records as we have room for straight from
+        # the caller's data. We always allow at least one, so that a small
+        # high-water mark can't stall us. If that was everything, hold on to
+        # whatever is left; otherwise the caller will come back with it.
+        full = len(data) - (len(data) % record_size)
+        allowed = max(room // record_size, 1) * record_size
+        if full > allowed:
+            self._write_all(data[:allowed])
+            return consumed + allowed
+
+        if full:
+            self._write_all(data[:full])
+        pending += data[full:]
+        return consumed + len(data)
+
+    def cork(self) -> None:
+        """
+        Starts accumulating written plaintext rather than encrypting it
+        straight away.
+
+        While corked, many small writes become a few full-size TLS records
+        (maximum-size, unless a record size policy says otherwise), rather
+        than one record each, which saves per-record overhead on the
+        wire. Full records are still produced as soon as there is enough data
+        for them. Call ``uncork`` to encrypt whatever is left.
+        """
+        self._corked = True
+
+    def uncork(self) -> None:
+        """
+        Stops accumulating written plaintext, and encrypts anything that was
+        held back while the buffer was corked.
+        """
+        self._corked = False
+        if self._cork_buffer:
+            self._write_all(self._cork_buffer)
+            self._cork_buffer.clear()
+
+    @contextmanager
+    def corked(self):
+        """
+        A context manager that corks the buffer for the duration of the
+        ``with`` block. See ``cork``.
+        """
+        self.cork()
         try:
-            return self._st_context.write(buf)
-        except WouldBlockError:
-            raise self._io_error() from None
+            yield self
+        finally:
+            self.uncork()
 
     def do_handshake(self) -> None:
+        self._handshake(resume_reading=True)
+
+    def do_handshake_async(self) -> concurrent.futures.Future:
+        """
+        Runs ``do_handshake`` on the context's handshake executor, and returns
+        a future for its outcome: ``None`` once the handshake has completed,
+        or the exception ``do_handshake`` raised, such as WantReadError.
+
+        Until the future is done the buffer belongs to the executor, so it
+        mustn't be used in any other way: hold on to ciphertext that arrives
+        in the meantime (up to ``receive_window()``, as it was beforehand),
+        and feed it in afterwards. The step may drain the receive buffer,
+        but can't call the resume callback from the executor, so call
+        ``maybe_resume_reading`` once the future is done, too.
+
+        Without a handshake executor, the handshake step runs straight away
+        and the future returned is already done.
+        """
+        # Flow control callbacks belong to the caller's thread, so resuming
+        # is done here rather than on the executor.
+        self.maybe_resume_reading()
+
+        executor = self._original_context.handshake_executor
+        if executor is not None:
+            return executor.submit(self._handshake, resume_reading=False)
+
+        future = concurrent.futures.Future()
+        try:
+            self._handshake(resume_reading=False)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(None)
+        return future
+
+    def _handshake(self, resume_reading):
         # In some instances we need to loop on this handshake (e.g. if we break
         # on server auth.)
         while True:
-            try:
-                return self._st_context.handshake()
-            except WouldBlockError:
-                raise self._io_error() from None
-            except SecureTransportError as e:
-                # We have some error handling we have to do here. Specifically,
-                # we want to check whether we're breaking on the server auth
-                # here: if we are, we need to do our own handshake.
-                if e.error_code is SSLErrors.errSSLServerAuthCompleted:
-                    self._validate_with_custom_trust()
-                    continue
-
-                # This isn't something we know how to treat specially. So
-                # don't.
-                raise
+            status = self._st_context.handshake_status()
+            if resume_reading and self._reading_paused:
+                self._maybe_resume_reading()
+            if not status:
+                return
+
+            # We have some error handling we have to do here. Specifically,
+            # we want to check whether we're breaking on the server auth
+            # here: if we are, we need to do our own handshake.
+            if status == _SERVER_AUTH_COMPLETED:
+                self._validate_with_custom_trust()
+                continue
+
+            # This isn't something we know how to treat specially. So don't.
+            self._raise_for_status(status)
+
+    def pending(self) -> int:
+        """
+        Returns the number of bytes of already-decrypted data that can be read
+        without any further data from the network.
+        """
+        return self._st_context.get_buffered_read_size()
+
+    def pending_ciphertext(self) -> int:
+        """
+        Returns the number of bytes received from the network that
+        SecureTransport hasn't consumed yet.
+        """
+        return len(self._receive_buffer)
+
+    def session_state(self) -> SSLSessionState:
+        """
+        Returns the state of the TLS session, as SecureTransport sees it.
+        """
+        return self._st_context.get_session_state()
 
     def cipher(self) -> Optional[CipherSuite]:
         try:
@@ -550,20 +1631,104 @@ class _SecureTransportBuffer(TLSWrappedBuffer):
         # it. That means we can't really look for a close_notify. Awkward.
         #
         # I'm not sure how best to handle this. Do we just read to EOF? How?
+        self.uncork()
         try:
             self._st_context.close()
         except WouldBlockError:
             # TODO: do we just swallow this instead?
             raise self._io_error() from None
 
+    @property
+    def send_high_water_mark(self) -> int:
+        """
+        The most ciphertext this buffer will hold for the network. See
+        ``write``.
+        """
+        return self._send_high_water_mark
+
     def receive_bytes_from_network(self, bytes):
-        self._receive_buffer += bytes
+        self._receive_buffer.append(bytes)
+        if (not self._reading_paused and
+                len(self._receive_buffer) >= self._receive_high_water_mark):
+            self._reading_paused = True
+            if self._pause_reading is not None:
+                self._pause_reading()
+
+    def _maybe_resume_reading(self):
+        """
+        Resumes reading if SecureTransport has drained the receive buffer to
+        its low-water mark.
+        """
+        if len(self._receive_buffer) <= self._receive_low_water_mark:
+            self._reading_paused = False
+            if self._resume_reading is not None:
+                self._resume_reading()
+
+    def maybe_resume_reading(self) -> None:
+        """
+        Resumes reading if it's paused, and SecureTransport has drained the
+        receive buffer to its low-water mark. Reads do this themselves: this
+        is for after ``do_handshake_async``.
+        """
+        if self._reading_paused:
+            self._maybe_resume_reading()
+
+    @property
+    def reading_paused(self) -> bool:
+        """
+        Whether the caller should stop feeding data from the network into this
+        buffer.
+
+        This becomes true once the received ciphertext waiting to be decrypted
+        reaches the receive high-water mark, and false again once reads have
+        drained it to the low-water mark. The buffer still accepts data while
+        paused: this is advice, not enforcement.
+        """
+        return self._reading_paused
+
+    def receive_window(self) -> int:
+        """
+        Returns how many more bytes of ciphertext the buffer will take from the
+        network before reaching its high-water mark. This is zero while
+        reading is paused.
+        """
+        if self._reading_paused:
+            return 0
+        return max(self._receive_high_water_mark - len(self._receive_buffer), 0)
+
+    def set_flow_control_callbacks(self, pause_reading=None,
+                                         resume_reading=None) -> None:
+        """
+        Sets callables to be called with no arguments when reading should
+        pause and resume, for event loops that push data into the buffer
+        rather than having it pulled. These mirror
+        ``asyncio.ReadTransport.pause_reading`` and ``resume_reading``.
+        """
+        self._pause_reading = pause_reading
+        self._resume_reading = resume_reading
 
     def peek_bytes(self, len):
-        return self._send_buffer[:len]
+        # This returns a copy, which stays valid whatever happens to the
+        # buffer afterwards. Use peek_segments to avoid the copy.
+        chunks = []
+        for segment in self._send_buffer.segments():
+            if len <= 0:
+                break
+            chunks.append(segment[:len])
+            len -= chunks[-1].nbytes
+        return b''.join(chunks)
+
+    def peek_segments(self):
+        """
+        Returns all of the data waiting to be sent to the network, as a tuple
+        of at most two memoryviews, suitable for vectored I/O such as
+        ``socket.sendmsg``. Use ``consume_bytes`` to discard the data once it
+        has been sent.
+        """
+        return self._send_buffer.segments()
 
     def consume_bytes(self, len):
-        del self._send_buffer[:len]
+        self._send_buffer.consume(len)
 
 
 class SecureTransportTrustStore(TrustStore):
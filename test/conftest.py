@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Lets the tests use the benchmarks' loopback peer.
+
+``bench/common.py`` runs the server side of the stand-in protocol, and
+``bench/standin/_build`` holds the stand-in ``_securetransport`` module once
+``bench/standin/build_standin.py`` has built it. Tests that need the module
+skip themselves when neither it nor the real one can be imported.
+"""
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH = os.path.join(HERE, '..', 'bench')
+
+sys.path.insert(0, BENCH)
+
+import common  # noqa: E402
+
+if os.path.isdir(common.STANDIN_BUILD_DIR):
+    sys.path.insert(0, common.STANDIN_BUILD_DIR)
+
+
+def _send_and_close(sock, data):
+    """
+    Completes the handshake, then sends ``data`` and close_notify without
+    waiting to be asked.
+    """
+    try:
+        common._recv_exact(sock, 5 + len(b'HELLO'))
+        sock.sendall(common.SERVER_HELLO)
+        sock.sendall(common.record(common.APPLICATION_DATA, data))
+        sock.sendall(common.record(common.ALERT, b'\x01\x00'))
+        sock.shutdown(socket.SHUT_WR)
+        # Wait for the client to hang up.
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+@pytest.fixture
+def closing_peer():
+    """
+    Returns a function that takes some data and returns one end of a socket
+    pair, with a stand-in server on the other end that sends the data and
+    then close_notify as soon as the handshake is done.
+    """
+    def closing_peer(data):
+        client, server = socket.socketpair()
+        threading.Thread(
+            target=_send_and_close, args=(server, data), daemon=True
+        ).start()
+        return client
+    return closing_peer
+
+
+@pytest.fixture
+def silent_peer():
+    """
+    Returns a function that returns one end of a socket pair whose other end
+    never says anything, until the test is over.
+    """
+    servers = []
+
+    def silent_peer():
+        client, server = socket.socketpair()
+        servers.append(server)
+        return client
+
+    yield silent_peer
+    for server in servers:
+        server.close()
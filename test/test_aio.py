@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the asyncio transport against a loopback stand-in server.
+
+Each test runs its own event loop with ``asyncio.run``, and talks to the
+stand-in server from ``bench/common.py`` over a socket pair.
+"""
+import asyncio
+import concurrent.futures
+
+import pytest
+
+pytest.importorskip('_securetransport')
+
+import common  # noqa: E402
+from securetransport import aio  # noqa: E402
+from securetransport.tlsapi import SecureTransportClientContext  # noqa: E402
+
+
+def run(coroutine, timeout=10):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout))
+
+
+def context(**kwargs):
+    return SecureTransportClientContext(common.configuration(), **kwargs)
+
+
+def open_connection(sock, context, **kwargs):
+    return aio.open_connection(
+        sock=sock, context=context, server_hostname='example.com', **kwargs
+    )
+
+
+class Collector(asyncio.Protocol):
+    """
+    An application protocol that records what happens to it.
+    """
+    def __init__(self):
+        self.data = bytearray()
+        self.eof = False
+        self.lost = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.data += data
+
+    def eof_received(self):
+        self.eof = True
+
+    def connection_lost(self, exc):
+        self.lost.set_result(exc)
+
+
+class TestConnection:
+    def test_echo(self):
+        async def main():
+            reader, writer = await open_connection(
+                common.peer_socket(), context()
+            )
+            writer.write(b'hello')
+            assert await reader.readexactly(5) == b'hello'
+            assert writer.get_extra_info('sslcontext') is not None
+
+            writer.close()
+            await writer.wait_closed()
+
+        run(main())
+
+    def test_bulk_echo(self):
+        async def main():
+            reader, writer = await open_connection(
+                common.peer_socket(), context()
+            )
+            payload = bytes(range(256)) * 4096
+
+            async def send():
+                writer.write(payload)
+                await writer.drain()
+
+            sender = asyncio.ensure_future(send())
+            assert await reader.readexactly(len(payload)) == payload
+            await sender
+
+            writer.close()
+            await writer.wait_closed()
+
+        run(main())
+
+    def test_handshake_executor(self):
+        async def main():
+            with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                reader, writer = await open_connection(
+                    common.peer_socket(),
+                    context(handshake_executor=executor)
+                )
+                writer.write(b'hello')
+                assert await reader.readexactly(5) == b'hello'
+
+                writer.close()
+                await writer.wait_closed()
+
+        run(main())
+
+    def test_handshake_timeout(self, silent_peer):
+        async def main():
+            with pytest.raises(ConnectionAbortedError):
+                await open_connection(
+                    silent_peer(), context(), ssl_handshake_timeout=0.05
+                )
+
+        run(main())
+
+    def test_start_tls(self):
+        async def main():
+            loop = asyncio.get_running_loop()
+            transport, protocol = await loop.create_connection(
+                Collector, sock=common.peer_socket()
+            )
+            tls_transport = await aio.start_tls(
+                transport, protocol, context(), server_hostname='example.com'
+            )
+            tls_transport.write(b'hello')
+            while len(protocol.data) < 5:
+                await asyncio.sleep(0.01)
+            assert protocol.data == b'hello'
+
+            tls_transport.close()
+            assert await protocol.lost is None
+
+        run(main())
+
+
+class TestReading:
+    def test_close_notify_is_eof(self, closing_peer):
+        async def main():
+            reader, writer = await open_connection(
+                closing_peer(b'goodbye'), context()
+            )
+            assert await reader.read() == b'goodbye'
+            assert reader.at_eof()
+
+            writer.close()
+            await writer.wait_closed()
+
+        run(main())
+
+    def test_close_notify_reaches_the_protocol(self, closing_peer):
+        async def main():
+            transport, protocol = await aio.create_connection(
+                Collector, sock=closing_peer(b'goodbye'),
+                context=context(), server_hostname='example.com'
+            )
+            assert await protocol.lost is None
+            assert protocol.data == b'goodbye'
+            assert protocol.eof
+            assert transport.is_closing()
+
+        run(main())
+
+    def test_pause_and_resume_reading(self):
+        async def main():
+            transport, protocol = await aio.create_connection(
+                Collector, sock=common.peer_socket(),
+                context=context(receive_high_water_mark=64 * 1024),
+                server_hostname='example.com'
+            )
+            tls = transport.get_extra_info('ssl_object')
+            payload = b'x' * (1024 * 1024)
+
+            transport.pause_reading()
+            assert not transport.is_reading()
+            transport.write(payload)
+
+            # Nothing is delivered, and once the receive buffer is full we
+            # stop reading from the network.
+            while not tls.reading_paused:
+                await asyncio.sleep(0.01)
+            assert not protocol.data
+
+            transport.resume_reading()
+            assert transport.is_reading()
+            while len(protocol.data) < len(payload):
+                await asyncio.sleep(0.01)
+            assert protocol.data == payload
+
+            transport.close()
+            await protocol.lost
+
+        run(main())
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the connection pool's bookkeeping.
+
+These replace the pool's connections with fakes over socket pairs, so that
+the tests control what the liveness check sees.
+"""
+import socket
+import time
+
+import pytest
+
+pytest.importorskip('_securetransport')
+
+from securetransport import pool as pool_module  # noqa: E402
+from securetransport.low_level import SSLSessionState  # noqa: E402
+from securetransport.tls import CipherSuite, TLSConfiguration  # noqa: E402
+from securetransport.tlsapi import SecureTransportClientContext  # noqa: E402
+
+
+class FakeSocket:
+    """
+    Stands in for a WrappedSocket, as far as the pool is concerned.
+    """
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = False
+        self.timeout = None
+        self.state = SSLSessionState.Connected
+        self.unread = 0
+        self.unread_ciphertext = 0
+
+    def session_state(self):
+        return self.state
+
+    def pending(self):
+        return self.unread
+
+    def pending_ciphertext(self):
+        return self.unread_ciphertext
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def close(self):
+        self.closed = True
+        self.raw.close()
+
+
+@pytest.fixture
+def peers(monkeypatch):
+    """
+    Makes every connection the pool opens a FakeSocket, and returns a dict
+    mapping each to the other end of its socket pair.
+    """
+    peers = {}
+
+    def connect(self, key, host, port, context, timeout):
+        raw, peer = socket.socketpair()
+        sock = FakeSocket(raw)
+        peers[sock] = peer
+        return pool_module._PooledConnection(key, sock, raw)
+
+    monkeypatch.setattr(pool_module.ConnectionPool, '_connect', connect)
+    yield peers
+    for peer in peers.values():
+        peer.close()
+
+
+@pytest.fixture
+def context():
+    return SecureTransportClientContext(
+        TLSConfiguration(ciphers=list(CipherSuite))
+    )
+
+
+class TestConnectionPool:
+    def test_reuses_connections(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        sock = pool.get('example.com', 443, context)
+        pool.put(sock)
+
+        assert pool.get('example.com', 443, context) is sock
+        assert pool.stats.requests == 2
+        assert pool.stats.hits == 1
+        assert pool.stats.handshakes == 1
+        assert len(pool) == 1
+
+    def test_most_recently_used_first(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        first = pool.get('example.com', 443, context)
+        second = pool.get('example.com', 443, context)
+        pool.put(first)
+        pool.put(second)
+
+        assert pool.get('example.com', 443, context) is second
+        assert pool.get('example.com', 443, context) is first
+
+    def test_keys_are_separate(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        sock = pool.get('example.com', 443, context)
+        pool.put(sock)
+
+        assert pool.get('example.org', 443, context) is not sock
+        assert pool.get('example.com', 8443, context) is not sock
+        assert len(pool) == 3
+
+    def test_sets_the_timeout_on_reuse(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        sock = pool.get('example.com', 443, context)
+        pool.put(sock)
+
+        pool.get('example.com', 443, context, timeout=5)
+        assert sock.timeout == 5
+
+    @pytest.mark.parametrize('spoil', [
+        lambda sock, peer: setattr(sock, 'unread', 1),
+        lambda sock, peer: setattr(sock, 'unread_ciphertext', 1),
+        lambda sock, peer: setattr(sock, 'state', SSLSessionState.Closed),
+        lambda sock, peer: peer.sendall(b'x'),
+        lambda sock, peer: peer.close(),
+    ], ids=[
+        'unread plaintext', 'unread ciphertext', 'session closed',
+        'peer sent data', 'peer closed',
+    ])
+    def test_unusable_connections_are_not_pooled(self, peers, context,
+                                                 spoil):
+        pool = pool_module.ConnectionPool()
+        sock = pool.get('example.com', 443, context)
+        spoil(sock, peers[sock])
+        pool.put(sock)
+
+        assert sock.closed
+        assert len(pool) == 0
+        assert pool.get('example.com', 443, context) is not sock
+
+    def test_connections_spoiled_while_idle_are_dropped(self, peers,
+                                                        context):
+        pool = pool_module.ConnectionPool()
+        sock = pool.get('example.com', 443, context)
+        pool.put(sock)
+        peers[sock].close()
+
+        assert pool.get('example.com', 443, context) is not sock
+        assert sock.closed
+        assert pool.stats.dropped == 1
+        assert pool.stats.hits == 0
+        assert len(pool) == 1
+
+    def test_idle_connections_expire(self, peers, context):
+        pool = pool_module.ConnectionPool(idle_timeout=0.01)
+        sock = pool.get('example.com', 443, context)
+        pool.put(sock)
+        time.sleep(0.02)
+
+        assert pool.prune() == 1
+        assert sock.closed
+        assert pool.stats.expired == 1
+        assert len(pool) == 0
+
+    def test_waits_for_a_slot(self, peers, context):
+        pool = pool_module.ConnectionPool(max_per_host=1)
+        sock = pool.get('example.com', 443, context)
+
+        with pytest.raises(socket.timeout):
+            pool.get('example.com', 443, context, timeout=0.01)
+        assert len(pool) == 1
+
+        # Discarding a connection frees its slot.
+        pool.discard(sock)
+        assert sock.closed
+        assert len(pool) == 0
+        pool.get('example.com', 443, context, timeout=0.01)
+
+    def test_failed_connects_free_their_slot(self, monkeypatch, context):
+        def connect(self, key, host, port, context, timeout):
+            raise ConnectionRefusedError()
+
+        monkeypatch.setattr(pool_module.ConnectionPool, '_connect', connect)
+        pool = pool_module.ConnectionPool(max_per_host=1)
+        for _ in range(2):
+            with pytest.raises(ConnectionRefusedError):
+                pool.get('example.com', 443, context, timeout=0.01)
+        assert len(pool) == 0
+
+    def test_connection_context_manager(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        with pool.connection('example.com', 443, context) as sock:
+            pass
+        assert not sock.closed
+        assert pool.get('example.com', 443, context) is sock
+        pool.put(sock)
+
+        with pytest.raises(RuntimeError):
+            with pool.connection('example.com', 443, context) as sock:
+                raise RuntimeError()
+        assert sock.closed
+        assert len(pool) == 0
+
+    def test_rejects_foreign_connections(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        with pytest.raises(ValueError):
+            pool.put(FakeSocket(None))
+
+    def test_close(self, peers, context):
+        pool = pool_module.ConnectionPool()
+        idle = pool.get('example.com', 443, context)
+        busy = pool.get('example.com', 443, context)
+        pool.put(idle)
+
+        pool.close()
+        assert idle.closed
+        assert not busy.closed
+        with pytest.raises(ValueError):
+            pool.get('example.com', 443, context)
+
+        # Connections handed back after closing are closed too.
+        pool.put(busy)
+        assert busy.closed
+        assert len(pool) == 0
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Reactor against loopback stand-in servers.
+"""
+import socket
+
+import pytest
+
+pytest.importorskip('_securetransport')
+
+import common  # noqa: E402
+from securetransport.reactor import Reactor  # noqa: E402
+from securetransport.tlsapi import SecureTransportClientContext  # noqa: E402
+
+
+class Recorder:
+    """
+    Callbacks for a connection that record what happens to it, and send
+    ``message`` once it has connected, if given.
+    """
+    def __init__(self, message=None):
+        self.message = message
+        self.connected = False
+        self.data = bytearray()
+        self.closed = False
+        self.exc = None
+
+    def on_connect(self, connection):
+        self.connected = True
+        if self.message is not None:
+            connection.send(self.message)
+
+    def on_data(self, connection, data):
+        self.data += data
+        if self.message is not None and len(self.data) >= len(self.message):
+            connection.close()
+
+    def on_close(self, connection, exc):
+        self.closed = True
+        self.exc = exc
+
+    def callbacks(self):
+        return {
+            'on_connect': self.on_connect,
+            'on_data': self.on_data,
+            'on_close': self.on_close,
+        }
+
+
+@pytest.fixture
+def context():
+    return SecureTransportClientContext(common.configuration())
+
+
+@pytest.fixture
+def reactor():
+    reactor = Reactor()
+    yield reactor
+    reactor.close()
+
+
+def refused_address():
+    """
+    Returns a loopback address that nothing is listening on.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    address = sock.getsockname()
+    sock.close()
+    return address
+
+
+def run(reactor, deadline=10):
+    """
+    Runs the reactor until it has no connections left, failing the test if
+    that takes more than ``deadline`` seconds.
+    """
+    timer = reactor.timers.schedule(
+        deadline, pytest.fail, "The reactor didn't finish"
+    )
+    reactor.run()
+    timer.cancel()
+
+
+class TestReactor:
+    def test_register(self, reactor, context):
+        recorder = Recorder(b'hello')
+        sock = context.wrap_socket(
+            common.peer_socket(), server_hostname=b'example.com'
+        )
+        reactor.register(sock, **recorder.callbacks())
+        run(reactor)
+
+        assert recorder.connected
+        assert recorder.data == b'hello'
+        assert recorder.closed
+        assert recorder.exc is None
+        assert len(reactor) == 0
+
+    def test_connect(self, reactor, context):
+        recorder = Recorder(b'x' * 100000)
+        reactor.connect(
+            common.listener(), context, b'example.com', **recorder.callbacks()
+        )
+        run(reactor)
+
+        assert recorder.data == recorder.message
+        assert recorder.exc is None
+
+    def test_connection_refused(self, reactor, context):
+        recorder = Recorder()
+        connection = reactor.connect(
+            refused_address(), context, b'example.com', **recorder.callbacks()
+        )
+        run(reactor)
+
+        assert not recorder.connected
+        assert isinstance(recorder.exc, ConnectionRefusedError)
+        assert connection.closed
+
+    def test_falls_back_to_the_next_address(self, monkeypatch, reactor,
+                                            context):
+        def getaddrinfo(host, port, *args, **kwargs):
+            return [
+                (socket.AF_INET, socket.SOCK_STREAM, 0, '', address)
+                for address in (refused_address(), common.listener())
+            ]
+
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        recorder = Recorder(b'hello')
+        reactor.connect(
+            ('example.com', 443), context, b'example.com',
+            **recorder.callbacks()
+        )
+        run(reactor)
+
+        assert recorder.data == b'hello'
+        assert recorder.exc is None
+
+    def test_close_notify(self, reactor, context, closing_peer):
+        recorder = Recorder()
+        sock = context.wrap_socket(
+            closing_peer(b'goodbye'), server_hostname=b'example.com'
+        )
+        reactor.register(sock, **recorder.callbacks())
+        run(reactor)
+
+        assert recorder.data == b'goodbye'
+        assert recorder.closed
+        assert recorder.exc is None
+
+
+class TestTimeouts:
+    def test_handshake_timeout(self, context, silent_peer):
+        reactor = Reactor(handshake_timeout=0.05)
+        recorder = Recorder()
+        sock = context.wrap_socket(
+            silent_peer(), server_hostname=b'example.com'
+        )
+        reactor.register(sock, **recorder.callbacks())
+        run(reactor)
+        reactor.close()
+
+        assert not recorder.connected
+        assert isinstance(recorder.exc, socket.timeout)
+
+    def test_idle_timeout(self, context):
+        reactor = Reactor(idle_timeout=0.05)
+        recorder = Recorder()
+        sock = context.wrap_socket(
+            common.peer_socket(), server_hostname=b'example.com'
+        )
+        reactor.register(sock, **recorder.callbacks())
+        run(reactor)
+        reactor.close()
+
+        assert recorder.connected
+        assert isinstance(recorder.exc, socket.timeout)
+
+    def test_read_timeout(self, reactor, context):
+        recorder = Recorder()
+        sock = context.wrap_socket(
+            common.peer_socket(), server_hostname=b'example.com'
+        )
+        connection = reactor.register(sock, **recorder.callbacks())
+        for _ in range(100):
+            if connection.connected:
+                break
+            reactor.run_once(0.01)
+        assert connection.connected
+
+        connection.set_read_timeout(0.05)
+        run(reactor)
+
+        assert isinstance(recorder.exc, socket.timeout)
+
+    def test_data_disarms_the_read_timeout(self, reactor, context):
+        recorder = Recorder()
+        sock = context.wrap_socket(
+            common.peer_socket(), server_hostname=b'example.com'
+        )
+        connection = reactor.register(sock, **recorder.callbacks())
+        connection.set_read_timeout(0.05)
+        connection.send(b'hello')
+        for _ in range(100):
+            if recorder.data:
+                break
+            reactor.run_once(0.01)
+        assert recorder.data == b'hello'
+
+        # Closing from outside a callback doesn't wait for more data.
+        reactor.timers.schedule(0.1, connection.close)
+        run(reactor)
+
+        assert recorder.exc is None
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the ring buffers that hold ciphertext on its way to and from the
+network.
+"""
+import random
+
+import pytest
+
+pytest.importorskip('_securetransport')
+
+from securetransport.low_level import NativeRingBuffer  # noqa: E402
+
+
+def contents(ring):
+    return b''.join(bytes(segment) for segment in ring.segments())
+
+
+def wrapped(capacity=16):
+    """
+    A ring holding ``b'abcdefghij'`` that wraps around the end of its
+    storage.
+    """
+    ring = NativeRingBuffer(capacity)
+    ring.append(b'x' * 12)
+
+    # Emptying the ring would rewind it, so keep a byte in it until the new
+    # data has gone in.
+    ring.consume(11)
+    ring.append(b'abcdefghij')
+    ring.consume(1)
+    return ring
+
+
+class TestRingBuffer:
+    def test_starts_empty(self):
+        ring = NativeRingBuffer(16)
+        assert len(ring) == 0
+        assert ring.capacity == 16
+        assert ring.segments() == ()
+        assert bytes(ring.peek(10)) == b''
+
+    def test_append_peek_consume(self):
+        ring = NativeRingBuffer(16)
+        ring.append(b'hello')
+        ring.append(bytearray(b' world'))
+        assert len(ring) == 11
+        assert bytes(ring.peek(5)) == b'hello'
+
+        # Peeking doesn't consume.
+        assert bytes(ring.peek(100)) == b'hello world'
+
+        ring.consume(6)
+        assert len(ring) == 5
+        assert bytes(ring.peek(100)) == b'world'
+
+    def test_consuming_more_than_is_buffered(self):
+        ring = NativeRingBuffer(16)
+        ring.append(b'abc')
+        ring.consume(100)
+        assert len(ring) == 0
+        assert ring.segments() == ()
+
+    def test_wrapped_data_is_in_two_segments(self):
+        ring = wrapped()
+        segments = ring.segments()
+        assert [bytes(segment) for segment in segments] == [b'abcd', b'efghij']
+
+        # peek only returns the contiguous part.
+        assert bytes(ring.peek(100)) == b'abcd'
+        ring.consume(4)
+        assert bytes(ring.peek(100)) == b'efghij'
+
+    def test_emptying_rewinds(self):
+        ring = wrapped()
+        ring.consume(len(ring))
+
+        # After rewinding, a full buffer's worth is contiguous again.
+        ring.append(b'y' * 16)
+        assert len(ring.segments()) == 1
+        assert ring.capacity == 16
+
+    def test_grows_to_fit_keeping_order(self):
+        ring = wrapped()
+        ring.append(b'0123456789')
+        assert ring.capacity == 32
+        assert len(ring) == 20
+        assert contents(ring) == b'abcdefghij0123456789'
+
+    def test_readinto_across_the_wrap(self):
+        ring = wrapped()
+        target = bytearray(7)
+        assert ring.readinto(target) == 7
+        assert target == b'abcdefg'
+        assert contents(ring) == b'hij'
+
+        target = bytearray(10)
+        assert ring.readinto(target) == 3
+        assert target[:3] == b'hij'
+        assert len(ring) == 0
+
+    def test_accepts_buffer_protocol_objects(self):
+        ring = NativeRingBuffer(16)
+        ring.append(memoryview(b'abc'))
+        ring.append(bytearray(b'def'))
+        ring.append(memoryview(b'--ghi--')[2:5])
+        assert contents(ring) == b'abcdefghi'
+
+    def test_views_survive_growth(self):
+        ring = NativeRingBuffer(16)
+        ring.append(b'abcdefgh')
+        view = ring.peek(8)
+
+        ring.append(b'z' * 64)
+        assert ring.capacity > 16
+        assert bytes(view) == b'abcdefgh'
+
+    def test_matches_a_bytearray(self):
+        rng = random.Random(1234)
+        ring = NativeRingBuffer(64)
+        model = bytearray()
+
+        for _ in range(2000):
+            if rng.random() < 0.5:
+                length = rng.randrange(40)
+                data = bytes(rng.getrandbits(8) for _ in range(length))
+                ring.append(data)
+                model += data
+            else:
+                amt = rng.randrange(50)
+                view = ring.peek(amt)
+                assert bytes(view) == model[:len(view)]
+                ring.consume(amt)
+                del model[:amt]
+
+            assert len(ring) == len(model)
+            assert contents(ring) == model
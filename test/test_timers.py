@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the hashed timer wheel.
+"""
+import pytest
+
+from securetransport.timers import TimerWheel
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def wheel(clock):
+    return TimerWheel(tick=0.1, slots=8, clock=clock)
+
+
+class TestTimerWheel:
+    def test_timers_fire_once_due(self, clock, wheel):
+        fired = []
+        wheel.schedule(0.25, fired.append, 'a')
+
+        clock.now += 0.2
+        assert wheel.expire() == 0
+        assert fired == []
+
+        clock.now += 0.2
+        assert wheel.expire() == 1
+        assert fired == ['a']
+        assert len(wheel) == 0
+
+    def test_timers_never_fire_early(self, clock, wheel):
+        fired = []
+        timer = wheel.schedule(0.3, lambda: fired.append(clock.now))
+
+        while not fired:
+            clock.now += 0.01
+            wheel.expire()
+        assert fired[0] >= timer.deadline
+        assert fired[0] - timer.deadline <= 0.1 + 1e-9
+
+    def test_timers_fire_in_deadline_order(self, clock, wheel):
+        fired = []
+        wheel.schedule(0.15, fired.append, 'b')
+        wheel.schedule(0.11, fired.append, 'a')
+        wheel.schedule(0.19, fired.append, 'c')
+
+        clock.now += 1
+        assert wheel.expire() == 3
+        assert fired == ['a', 'b', 'c']
+
+    def test_timers_beyond_a_full_turn_wait_their_turn(self, clock, wheel):
+        # The wheel covers 0.8 seconds, so this goes round more than once.
+        fired = []
+        wheel.schedule(2.0, fired.append, 'a')
+
+        for _ in range(19):
+            clock.now += 0.1
+            wheel.expire()
+        assert fired == []
+
+        clock.now += 0.2
+        wheel.expire()
+        assert fired == ['a']
+
+    def test_long_gaps_fire_everything_due(self, clock, wheel):
+        fired = []
+        for delay in (0.1, 0.5, 1.5, 3.0):
+            wheel.schedule(delay, fired.append, delay)
+
+        clock.now += 10
+        assert wheel.expire() == 4
+        assert fired == [0.1, 0.5, 1.5, 3.0]
+
+    def test_cancel(self, clock, wheel):
+        fired = []
+        timer = wheel.schedule(0.1, fired.append, 'a')
+        assert timer.active
+        assert len(wheel) == 1
+
+        timer.cancel()
+        assert not timer.active
+        assert len(wheel) == 0
+
+        # Cancelling twice is harmless.
+        timer.cancel()
+        assert len(wheel) == 0
+
+        clock.now += 1
+        assert wheel.expire() == 0
+        assert fired == []
+
+    def test_fired_timers_are_inactive(self, clock, wheel):
+        seen = []
+        timer = wheel.schedule(0.1, lambda: seen.append(timer.active))
+
+        clock.now += 1
+        wheel.expire()
+        assert seen == [False]
+        assert not timer.active
+
+        timer.cancel()
+        assert len(wheel) == 0
+
+    def test_callback_can_cancel_a_later_due_timer(self, clock, wheel):
+        fired = []
+        later = wheel.schedule(0.2, fired.append, 'later')
+
+        def cancel_later():
+            fired.append('first')
+            later.cancel()
+
+        wheel.schedule(0.1, cancel_later)
+
+        clock.now += 1
+        assert wheel.expire() == 1
+        assert fired == ['first']
+        assert not later.active
+        assert len(wheel) == 0
+
+    def test_callback_can_schedule(self, clock, wheel):
+        fired = []
+
+        def reschedule():
+            fired.append('first')
+            wheel.schedule(0.1, fired.append, 'second')
+
+        wheel.schedule(0.1, reschedule)
+
+        clock.now += 0.2
+        assert wheel.expire() == 1
+        assert fired == ['first']
+        assert len(wheel) == 1
+
+        # The new timer goes in a tick we haven't expired yet.
+        clock.now += 0.2
+        assert wheel.expire() == 1
+        assert fired == ['first', 'second']
+
+    def test_raising_callback_leaves_the_rest_for_next_tick(self, clock,
+                                                             wheel):
+        fired = []
+
+        def explode():
+            raise RuntimeError("boom")
+
+        wheel.schedule(0.1, explode)
+        after = wheel.schedule(0.2, fired.append, 'after')
+
+        clock.now += 1
+        with pytest.raises(RuntimeError):
+            wheel.expire()
+        assert fired == []
+        assert after.active
+        assert len(wheel) == 1
+
+        clock.now += 0.1
+        assert wheel.expire() == 1
+        assert fired == ['after']
+        assert len(wheel) == 0
+
+    def test_next_timeout(self, clock, wheel):
+        assert wheel.next_timeout() is None
+
+        # Halfway through a tick, the next one is half a tick away.
+        clock.now += 0.05
+        wheel.schedule(5, lambda: None)
+        assert wheel.next_timeout() == pytest.approx(0.05)
+
+        clock.now += 1
+        assert wheel.next_timeout() == 0
+
+    def test_rejects_bad_arguments(self):
+        with pytest.raises(ValueError):
+            TimerWheel(tick=0)
+        with pytest.raises(ValueError):
+            TimerWheel(slots=0)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for WrappedSocket against a loopback stand-in server.
+"""
+import http.client
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip('_securetransport')
+
+import common  # noqa: E402
+from securetransport import tlsapi  # noqa: E402
+from securetransport.tlsapi import (  # noqa: E402
+    RecordSizePolicy, SecureTransportClientContext
+)
+
+
+RESPONSE_BODY = b'x' * 50000
+RESPONSE = (
+    b'HTTP/1.1 200 OK\r\n'
+    b'Content-Type: text/plain\r\n'
+    b'Connection: close\r\n'
+    b'\r\n' + RESPONSE_BODY
+)
+
+
+def serve_close_delimited(sock, response):
+    """
+    Completes the handshake, waits for a request, then sends ``response``
+    followed by close_notify, as a server does with a body that ends when
+    the connection does.
+    """
+    try:
+        while True:
+            header = common._recv_exact(sock, 5)
+            if header is None:
+                return
+            record_type = header[0]
+            length = int.from_bytes(header[3:5], 'big')
+            if length:
+                common._recv_exact(sock, length)
+
+            if record_type == common.HANDSHAKE:
+                sock.sendall(common.SERVER_HELLO)
+            elif record_type == common.APPLICATION_DATA:
+                for start in range(0, len(response), 16384):
+                    sock.sendall(common.record(
+                        common.APPLICATION_DATA,
+                        response[start:start + 16384]
+                    ))
+                sock.sendall(common.record(common.ALERT, b'\x01\x00'))
+                return
+    finally:
+        sock.shutdown(socket.SHUT_WR)
+        sock.close()
+
+
+@pytest.fixture
+def close_delimited():
+    """
+    A handshaken WrappedSocket to a server that answers one request and
+    then sends close_notify.
+    """
+    client, server = socket.socketpair()
+    thread = threading.Thread(
+        target=serve_close_delimited, args=(server, RESPONSE), daemon=True
+    )
+    thread.start()
+
+    context = SecureTransportClientContext(common.configuration())
+    sock = context.wrap_socket(client, server_hostname=b'example.com')
+    sock.do_handshake()
+    yield sock
+    sock.close()
+    thread.join()
+
+
+class TestCloseNotify:
+    def test_recv_returns_eof(self, close_delimited):
+        close_delimited.sendall(b'GET / HTTP/1.1\r\n\r\n')
+
+        received = bytearray()
+        while True:
+            data = close_delimited.recv(65536)
+            if not data:
+                break
+            received += data
+        assert received == RESPONSE
+
+        # EOF is sticky.
+        assert close_delimited.recv(65536) == b''
+        assert close_delimited.recv_into(bytearray(10)) == 0
+
+    def test_makefile_reads_to_eof(self, close_delimited):
+        close_delimited.sendall(b'GET / HTTP/1.1\r\n\r\n')
+        with close_delimited.makefile('rb') as f:
+            assert f.read() == RESPONSE
+
+    def test_http_client_reads_close_delimited_body(self, close_delimited):
+        connection = http.client.HTTPConnection('example.com')
+        connection.sock = close_delimited
+        connection.request('GET', '/')
+        response = connection.getresponse()
+
+        assert response.status == 200
+        assert response.read() == RESPONSE_BODY
+        response.close()
+
+
+class TestEcho:
+    @pytest.mark.parametrize('native_io', [True, False])
+    def test_echo(self, native_io):
+        context = SecureTransportClientContext(
+            common.configuration(), native_io=native_io
+        )
+        sock = context.wrap_socket(
+            common.peer_socket(), server_hostname=b'example.com'
+        )
+        sock.do_handshake()
+
+        # Several times the rings' default capacity, so data wraps around.
+        payload = bytes(range(256)) * 1024
+        for start in range(0, len(payload), 65536):
+            chunk = payload[start:start + 65536]
+            sock.sendall(chunk)
+            received = bytearray()
+            while len(received) < len(chunk):
+                received += sock.recv(65536)
+            assert received == chunk
+        sock.close()
+
+
+class TestRecordSizePolicy:
+    def test_small_records_are_sent_before_the_rest_are_encrypted(self):
+        context = SecureTransportClientContext(
+            common.configuration(),
+            record_size_policy=RecordSizePolicy(small_record_size=1000),
+        )
+        sock = context.wrap_socket(
+            common.peer_socket(echo=False),
+            server_hostname=b'example.com'
+        )
+        sock.do_handshake()
+
+        # Each send takes as much as has been sent so far, and at least one
+        # record, so the batches double.
+        payload = memoryview(b'x' * 100000)
+        sent = []
+        for _ in range(4):
+            sent.append(sock.send(payload))
+            payload = payload[sent[-1]:]
+        assert sent == [1000, 1000, 2000, 4000]
+        sock.close()
+
+
+class TestReceiveBuffer:
+    @pytest.fixture
+    def sock(self):
+        client, server = socket.socketpair()
+        context = SecureTransportClientContext(common.configuration())
+        sock = context.wrap_socket(client, server_hostname=b'example.com')
+        yield sock
+        sock.close()
+        server.close()
+
+    def read(self, sock, received):
+        sock._resize_receive_view(received)
+        return len(sock._receive_view)
+
+    def test_grows_after_repeated_full_reads(self, sock):
+        size = len(sock._receive_view)
+        assert size == tlsapi._MAX_RECORD_SIZE
+
+        # One full read isn't enough, nor are full reads with others between.
+        assert self.read(sock, size) == size
+        assert self.read(sock, size - 1) == size
+        assert self.read(sock, size) == size
+        assert self.read(sock, size) == size * 2
+
+    def test_growth_stops_at_the_maximum(self, sock):
+        sizes = set()
+        for _ in range(100):
+            size = len(sock._receive_view)
+            sizes.add(self.read(sock, size))
+        assert max(sizes) == tlsapi._MAX_RECEIVE_SIZE
+
+    def test_shrinks_once_reads_stay_small(self, sock):
+        for _ in range(100):
+            self.read(sock, len(sock._receive_view))
+        size = len(sock._receive_view)
+
+        for _ in range(tlsapi._RECEIVE_SHRINK_AFTER - 1):
+            assert self.read(sock, 100) == size
+        assert self.read(sock, 100) == size // 2
+
+        for _ in range(100):
+            self.read(sock, 100)
+        assert len(sock._receive_view) == tlsapi._MAX_RECORD_SIZE